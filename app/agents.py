@@ -0,0 +1,241 @@
+import hmac
+import io
+import ipaddress
+import json
+import math
+import socket
+import socketserver
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from app.port_knocker import Worker
+from app.port_utils import LISTENER_TIMEOUT, agent_max_ports, agent_token, scan_concurrency
+from app.port_expression import PortExpressionError, parse_port_expression
+from app.network_utils import get_local_ips
+from app.exporters import NdjsonExporter, ResultExporter, open_exporter
+from app.result_store import STATUSES
+
+AGENT_PORT = 9772
+AGENT_DEFAULT_HOST = '127.0.0.1'
+CONNECT_TIMEOUT = 5
+
+
+class AgentError(Exception):
+    """Raised when an agent refuses or fails a scan."""
+
+
+def parse_address(address: str, default_port: int) -> Tuple[str, int]:
+    """Split '[host:]port' or 'host[:port]' into a host, empty if not given, and a port."""
+    if address.isdigit():
+        return '', int(address)
+    parts = urlsplit(f"//{address}")
+    return parts.hostname or '', parts.port or default_port
+
+
+def is_loopback(host: str) -> bool:
+    """Tell whether host is a loopback address or 'localhost'."""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class AgentRequestHandler(socketserver.StreamRequestHandler):
+    """Run the scan a coordinator asks for and stream back one NDJSON export record per verdict.
+
+    The request is a single JSON line such as {"ports": "tcp:22,80", "protocol": "tcp", "token": "..."}. The reply
+    is the NDJSON export of the scan, or a single {"error": ...} line, and the connection is
+    closed once the scan is over.
+    """
+
+    def handle(self) -> None:
+        """Read the request, run the scan and stream its results."""
+        coordinator = self.client_address[0]
+        stream = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+
+        try:
+            request = json.loads(self.rfile.readline())
+            token = request.get('token') or ''
+            if self.server.token and not hmac.compare_digest(str(token).encode(), self.server.token.encode()):
+                logging.warning("Refused a scan from coordinator %s with a wrong or missing token.", coordinator)
+                stream.write(json.dumps({ 'error': "Invalid token" }) + "\n")
+                return
+            ports_list = parse_port_expression(request['ports'], request.get('protocol', 'tcp'))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logging.error("Invalid request from coordinator %s: %s", coordinator, e)
+            stream.write(json.dumps({ 'error': f"Invalid request: {e}" }) + "\n")
+            return
+
+        port_count = sum(len(ports) for ports in ports_list.values())
+        if port_count > self.server.max_ports:
+            logging.warning("Refused a scan of %s ports from coordinator %s, the maximum is %s.", port_count, coordinator, self.server.max_ports)
+            stream.write(json.dumps({ 'error': f"Too many ports ({port_count}), the maximum is {self.server.max_ports}" }) + "\n")
+            return
+
+        if not self.server.scan_lock.acquire(blocking=False):
+            logging.warning("Refused a scan from coordinator %s while another one is running.", coordinator)
+            stream.write(json.dumps({ 'error': "Agent is busy with another scan" }) + "\n")
+            return
+
+        try:
+            logging.info("Checking %s ports on %s for coordinator %s.", port_count, self.server.host, coordinator)
+            exporter = NdjsonExporter(stream, close_stream=False)
+            Worker(ports_list, self.server.host, exporter=exporter).run()
+            exporter.close()
+        finally:
+            self.server.scan_lock.release()
+
+
+class AgentServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], host: str, token: Optional[str] = None, max_ports: int = agent_max_ports) -> None:
+        """Listen for coordinators on address and run their scans of at most max_ports ports on the local IP host, one at a time.
+
+        Requests must carry token when one is set.
+        """
+        self.address_family = socket.AF_INET6 if ':' in address[0] else socket.AF_INET
+        super().__init__(address, AgentRequestHandler)
+        self.host = host
+        self.token = token
+        self.max_ports = max_ports
+        self.scan_lock = threading.Lock()
+
+
+def run_agent(address: str, host: Optional[str] = None, token: Optional[str] = agent_token) -> int:
+    """Serve scan requests from coordinators on '[host:]port' until interrupted, and return a process exit code.
+
+    Without a host, the agent only listens on loopback. Listening anywhere else requires a shared token.
+    """
+    listen_host, listen_port = parse_address(address, AGENT_PORT)
+    listen_host = listen_host or AGENT_DEFAULT_HOST
+    if not token and not is_loopback(listen_host):
+        logging.error("An agent listening on %s needs a shared token: set AGENT_TOKEN or pass --agent-token.", listen_host)
+        return 2
+
+    if host is None:
+        local_ips = get_local_ips()
+        if not local_ips:
+            logging.error("No local IP address found to listen on.")
+            return 2
+        host = local_ips[0]
+
+    try:
+        server = AgentServer((listen_host, listen_port), host, token)
+    except OSError as e:
+        logging.error("Could not start the agent on %s: %s", address, e)
+        return 2
+
+    logging.info("Agent listening on %s:%s, checking ports on %s.", *server.server_address[:2], host)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Agent stopped.")
+    finally:
+        server.server_close()
+    return 0
+
+
+def agent_scan_timeout(port_count: int) -> float:
+    """Return how long a coordinator waits for an agent to finish scanning port_count ports.
+
+    Agents are assumed to share this SCAN_CONCURRENCY, so the ports are checked in waves that each
+    last about one listener window. Every window is doubled to leave room for slow API responses.
+    """
+    waves = max(math.ceil(port_count / scan_concurrency), 1)
+    return CONNECT_TIMEOUT + 2 * LISTENER_TIMEOUT * waves
+
+
+def query_agent(agent: str, expression: str, protocol: str, exporter: Optional[ResultExporter] = None,
+                token: Optional[str] = agent_token) -> Dict[str, int]:
+    """Have an agent scan the ports of expression, write its records to the exporter and return its verdict counts.
+
+    Raises AgentError if the agent refuses the scan or does not finish it within agent_scan_timeout().
+    """
+    counts = dict.fromkeys(STATUSES[1:], 0)
+    timeout = agent_scan_timeout(sum(len(ports) for ports in parse_port_expression(expression, protocol).values()))
+    deadline = time.monotonic() + timeout
+
+    with socket.create_connection(parse_address(agent, AGENT_PORT), timeout=CONNECT_TIMEOUT) as sock:
+        sock.sendall((json.dumps({ 'ports': expression, 'protocol': protocol, 'token': token }) + "\n").encode())
+
+        try:
+            with sock.makefile('r', encoding='utf-8') as replies:
+                while True:
+                    # A hung or half-open agent must not block the coordinator past the deadline.
+                    sock.settimeout(max(deadline - time.monotonic(), 0.001))
+                    line = replies.readline()
+                    if not line:
+                        break
+                    record = json.loads(line)
+                    if 'error' in record:
+                        raise AgentError(record['error'])
+                    counts[record['status']] += 1
+                    if exporter is not None:
+                        exporter.write_records([record])
+        except socket.timeout:
+            raise AgentError(f"No complete reply within {timeout:.0f} seconds") from None
+    return counts
+
+
+def run_coordinator(agents: List[str], expression: str, protocol: str = 'tcp', export_path: Optional[str] = None,
+                    export_format: Optional[str] = None, compress: Optional[bool] = None, token: Optional[str] = agent_token) -> int:
+    """Run one scan on every agent in parallel, merge their records into one export and return a process exit code.
+
+    Each agent is 'host[:port]', scanning expression, or 'host[:port]=expression' for its own ports.
+    """
+    assignments = []
+    for agent in agents:
+        address, _, agent_expression = agent.partition('=')
+        agent_expression = agent_expression or expression
+        try:
+            parse_port_expression(agent_expression, protocol)
+        except PortExpressionError as e:
+            logging.error("Invalid port expression '%s' for agent %s: %s", agent_expression, address, e)
+            return 2
+        assignments.append((address, agent_expression))
+
+    exporter = None
+    if export_path:
+        try:
+            exporter = open_exporter(export_path, export_format, compress)
+        except (OSError, ValueError) as e:
+            logging.error("Could not open export %s: %s", export_path, e)
+            return 2
+
+    reports: Dict[str, Dict[str, int]] = {}
+    failures: Dict[str, str] = {}
+
+    def collect(address: str, agent_expression: str) -> None:
+        try:
+            reports[address] = query_agent(address, agent_expression, protocol, exporter, token)
+        except (OSError, ValueError, KeyError, AgentError) as e:
+            failures[address] = str(e)
+
+    threads = [threading.Thread(target=collect, args=assignment) for assignment in assignments]
+    logging.info("Dispatching the scan to %s agents.", len(threads))
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        if exporter is not None:
+            exporter.close()
+
+    totals = dict.fromkeys(STATUSES[1:], 0)
+    for address, _ in assignments:
+        if address in failures:
+            logging.error("Agent %s failed: %s", address, failures[address])
+            continue
+        for status, count in reports[address].items():
+            totals[status] += count
+        logging.info("Agent %s: %s", address, ", ".join(f"{status}={count}" for status, count in reports[address].items()))
+
+    logging.info("All agents (%s of %s answered): %s", len(reports), len(assignments), ", ".join(f"{status}={count}" for status, count in totals.items()))
+    return 1 if failures else 0
@@ -0,0 +1,103 @@
+import asyncio
+import socket
+import ipaddress
+import threading
+import time
+import logging
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class ApiEndpoint:
+    """Resolve the API host once and reuse the address until its TTL expires or a connection fails."""
+
+    def __init__(self, host: str, family: str = 'ipv4', ttl: float = 300) -> None:
+        """Initialize the endpoint for a 'host[:port]' value, resolved over the given address family."""
+        try:
+            host = f"[{ipaddress.IPv6Address(host)}]"
+        except ValueError:
+            pass
+
+        parts = urlsplit(f"//{host}")
+        self.hostname = parts.hostname
+        self.port = parts.port
+        self.family = family
+        self.ttl = ttl
+        self.host_header = host
+        self._address: Optional[str] = None
+        self._resolved_at = 0.0
+        self._lock = threading.Lock()
+
+
+    def address(self) -> str:
+        """Return 'ip[:port]' for the API, resolving the hostname only when the cached address is stale."""
+        with self._lock:
+            if self._address is None or time.monotonic() - self._resolved_at > self.ttl:
+                self._address = self._format(self._resolve())
+                self._resolved_at = time.monotonic()
+            return self._address
+
+
+    async def address_async(self) -> str:
+        """Return 'ip[:port]' like address(), resolving on the running event loop instead of blocking it."""
+        with self._lock:
+            if self._address is not None and time.monotonic() - self._resolved_at <= self.ttl:
+                return self._address
+
+        address = self._format(await self._resolve_async())
+        with self._lock:
+            self._address = address
+            self._resolved_at = time.monotonic()
+        return address
+
+
+    def invalidate(self) -> None:
+        """Forget the cached address so the next request resolves the hostname again."""
+        with self._lock:
+            self._address = None
+
+
+    def _resolve(self) -> str:
+        """Look the hostname up once over the endpoint's address family."""
+        if self._is_ip_literal():
+            return self.hostname
+
+        infos = socket.getaddrinfo(self.hostname, self.port or 80, self._address_family(), socket.SOCK_STREAM)
+        return self._first_address(infos)
+
+
+    async def _resolve_async(self) -> str:
+        """Look the hostname up like _resolve(), through the running event loop's resolver."""
+        if self._is_ip_literal():
+            return self.hostname
+
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(self.hostname, self.port or 80, family=self._address_family(), type=socket.SOCK_STREAM)
+        return self._first_address(infos)
+
+
+    def _is_ip_literal(self) -> bool:
+        """Tell whether the hostname is already an IP address."""
+        try:
+            ipaddress.ip_address(self.hostname)
+            return True
+        except ValueError:
+            return False
+
+
+    def _address_family(self) -> int:
+        """Return the socket family the hostname is resolved over."""
+        return socket.AF_INET6 if self.family == 'ipv6' else socket.AF_INET
+
+
+    def _first_address(self, infos: List[Tuple]) -> str:
+        """Pick the first address of a getaddrinfo() result and log it."""
+        address = infos[0][4][0]
+        logging.info("Resolved API host %s to %s.", self.hostname, address)
+        return address
+
+
+    def _format(self, address: str) -> str:
+        """Build the URL authority for an IP address, bracketing IPv6 literals."""
+        authority = f"[{address}]" if ':' in address else address
+        return f"{authority}:{self.port}" if self.port else authority
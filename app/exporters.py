@@ -0,0 +1,149 @@
+import csv
+import gzip
+import io
+import json
+import sys
+import threading
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, TextIO
+
+EXPORT_FIELDS = ['time', 'interface', 'family', 'protocol', 'port', 'status', 'latency_ms', 'duration_ms']
+EXPORT_FORMATS = ('csv', 'json', 'ndjson')
+
+
+class ResultExporter:
+    """Write one record per port verdict as soon as it is known, keeping nothing in memory."""
+
+    def __init__(self, stream: TextIO, close_stream: bool = True) -> None:
+        """Initialize the exporter over an open text stream."""
+        self.stream = stream
+        self.close_stream = close_stream
+        self.count = 0
+        self._lock = threading.Lock()
+
+
+    def write_port(self, interface: str, protocol: str, port: int, verdicts: Dict[str, str],
+                   latencies: Dict[str, float], duration: float) -> None:
+        """Write one record per address family for a checked port."""
+        now = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+        with self._lock:
+            for family, status in verdicts.items():
+                latency = latencies.get(family)
+                self.write_record({
+                    'time': now,
+                    'interface': interface,
+                    'family': family,
+                    'protocol': protocol,
+                    'port': port,
+                    'status': status,
+                    'latency_ms': round(latency * 1000, 3) if latency is not None else None,
+                    'duration_ms': round(duration * 1000, 3),
+                })
+                self.count += 1
+            self.stream.flush()
+
+
+    def write_records(self, records: List[Dict]) -> None:
+        """Write records built elsewhere, such as the ones streamed back by an agent."""
+        with self._lock:
+            for record in records:
+                self.write_record(record)
+                self.count += 1
+            self.stream.flush()
+
+
+    def write_record(self, record: Dict) -> None:
+        """Serialize a single record. Called with the lock held."""
+        raise NotImplementedError
+
+
+    def close(self) -> None:
+        """Finish the output and close the stream unless it is stdout."""
+        with self._lock:
+            self.write_footer()
+            self.stream.flush()
+            if self.close_stream:
+                self.stream.close()
+        logging.info("Exported %s results.", self.count)
+
+
+    def write_footer(self) -> None:
+        """Write whatever closes the document. Called with the lock held."""
+
+
+class CsvExporter(ResultExporter):
+    def __init__(self, stream: TextIO, close_stream: bool = True) -> None:
+        """Initialize the exporter and write the CSV header."""
+        super().__init__(stream, close_stream)
+        self._writer = csv.DictWriter(stream, fieldnames=EXPORT_FIELDS)
+        self._writer.writeheader()
+
+
+    def write_record(self, record: Dict) -> None:
+        """Write the record as a CSV row."""
+        self._writer.writerow(record)
+
+
+class NdjsonExporter(ResultExporter):
+    def write_record(self, record: Dict) -> None:
+        """Write the record as one JSON line."""
+        self.stream.write(json.dumps(record) + "\n")
+
+
+class JsonExporter(ResultExporter):
+    def __init__(self, stream: TextIO, close_stream: bool = True) -> None:
+        """Initialize the exporter and open the JSON array."""
+        super().__init__(stream, close_stream)
+        self.stream.write("[")
+
+
+    def write_record(self, record: Dict) -> None:
+        """Append the record to the JSON array."""
+        self.stream.write(("," if self.count else "") + "\n" + json.dumps(record))
+
+
+    def write_footer(self) -> None:
+        """Close the JSON array."""
+        self.stream.write("\n]\n")
+
+
+EXPORTERS = { 'csv': CsvExporter, 'json': JsonExporter, 'ndjson': NdjsonExporter }
+
+
+def guess_export_format(path: str) -> str:
+    """Infer the export format from a file name, defaulting to NDJSON."""
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith('.json'):
+        return 'json'
+    return 'ndjson'
+
+
+def open_exporter(path: str, export_format: Optional[str] = None, compress: Optional[bool] = None) -> ResultExporter:
+    """Open an exporter writing to path, or to stdout when path is '-'.
+
+    The format and gzip compression are inferred from the file name unless given.
+    """
+    export_format = export_format or guess_export_format(path)
+    if export_format not in EXPORTERS:
+        raise ValueError(f"Unknown export format: {export_format}. Use one of {', '.join(EXPORT_FORMATS)}.")
+
+    if path == '-':
+        if compress:
+            stream = io.TextIOWrapper(gzip.GzipFile(fileobj=sys.stdout.buffer, mode='wb'), encoding='utf-8', newline='')
+            return EXPORTERS[export_format](stream)
+        return EXPORTERS[export_format](sys.stdout, close_stream=False)
+
+    if compress is None:
+        compress = path.lower().endswith('.gz')
+    if compress:
+        stream = gzip.open(path, 'wt', encoding='utf-8', newline='')
+    else:
+        stream = open(path, 'w', encoding='utf-8', newline='')
+
+    logging.info("Exporting results to %s as %s%s.", path, export_format, " (gzip)" if compress else "")
+    return EXPORTERS[export_format](stream)
@@ -0,0 +1,81 @@
+import logging
+from contextlib import nullcontext
+from typing import Optional
+from app.port_knocker import Worker
+from app.result_store import ResultStore
+from app.port_expression import PortExpressionError, parse_port_expression
+from app.network_utils import get_local_ips
+from app.exporters import open_exporter
+from app.profiler import profile_phase
+from app.sharded_engine import run_sharded
+from app.run_diff import RunDiff, load_run, log_diff, statuses_from_store
+from app.progress import ScanProgress, logging_progress
+
+
+def run_headless(expression: str, protocol: str = 'tcp', host: Optional[str] = None, export_path: Optional[str] = None,
+                 export_format: Optional[str] = None, compress: Optional[bool] = None, shards: int = 1,
+                 diff_path: Optional[str] = None, progress_interval: Optional[float] = None) -> int:
+    """Check the ports described by expression without a window and return a process exit code.
+
+    The scan runs in shards processes if more than one, and is compared with the export or history at diff_path if given.
+    Its progress is logged every progress_interval seconds if given.
+    """
+    try:
+        with profile_phase('validation'):
+            ports_list = parse_port_expression(expression, protocol)
+    except PortExpressionError as e:
+        logging.error("Invalid port expression '%s': %s", expression, e)
+        return 2
+
+    if host is None:
+        local_ips = get_local_ips()
+        if not local_ips:
+            logging.error("No local IP address found to listen on.")
+            return 2
+        host = local_ips[0]
+
+    # Load the baseline first: it may be the file the export is about to overwrite.
+    baseline = None
+    if diff_path:
+        try:
+            baseline = load_run(diff_path)
+        except (OSError, ValueError, KeyError) as e:
+            logging.error("Could not load the run to compare with from %s: %s", diff_path, e)
+            return 2
+
+    exporter = None
+    if export_path:
+        try:
+            exporter = open_exporter(export_path, export_format, compress)
+        except (OSError, ValueError) as e:
+            logging.error("Could not open export %s: %s", export_path, e)
+            return 2
+
+    results = []
+    total = sum(len(ports) for ports in ports_list.values())
+    progress = ScanProgress(total)
+    logging.info("Checking %s ports on %s.", total, host)
+    try:
+        with logging_progress(progress, progress_interval) if progress_interval else nullcontext():
+            if shards > 1:
+                results.append(run_sharded(ports_list, host, shards, exporter, progress=progress))
+            else:
+                worker = Worker(ports_list, host, exporter=exporter, progress=progress)
+                worker.finished.connect(results.append)
+                worker.run()
+    finally:
+        if exporter is not None:
+            exporter.close()
+
+    if results:
+        with profile_phase('result rendering'):
+            log_summary(results[0])
+            if baseline is not None:
+                log_diff(RunDiff(baseline, statuses_from_store(results[0])), diff_path)
+    return 0
+
+
+def log_summary(results: ResultStore) -> None:
+    """Log how many ports ended in each state, per address family."""
+    for family, counts in results.counts().items():
+        logging.info("%s results: %s", family.upper(), ", ".join(f"{status}={count}" for status, count in counts.items()))
@@ -0,0 +1,202 @@
+import os
+import socket
+import selectors
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.port_utils import LISTENER_TIMEOUT, create_listening_sockets, answer_probe, is_out_of_descriptors, start_server
+from app.network_utils import get_host_families
+
+
+pool_enabled = os.getenv("LISTENER_POOL", "0") == "1"
+pool_idle_timeout = float(os.getenv("LISTENER_IDLE_TIMEOUT", "300"))
+pool_max_sockets = int(os.getenv("LISTENER_POOL_MAX", "0"))
+
+# Without an open file limit to derive the cap from, stay below the 512 sockets select() handles on Windows.
+DEFAULT_POOL_MAX_SOCKETS = 256
+
+ListenerKey = Tuple[str, str, int]
+
+port_logger = logging.getLogger('ports')
+
+
+def get_default_pool_size() -> int:
+    """Return how many sockets the pool may keep: half the open file limit, leaving the rest to probes and API requests."""
+    try:
+        import resource
+        soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except ImportError:
+        return DEFAULT_POOL_MAX_SOCKETS
+    if soft_limit == resource.RLIM_INFINITY:
+        return DEFAULT_POOL_MAX_SOCKETS * 16
+    return max(soft_limit // 2, 1)
+
+
+class ListenerPool:
+    """Keep listening sockets bound between runs so repeated scans skip bind() and listen()."""
+
+    def __init__(self, idle_timeout: float = pool_idle_timeout, max_sockets: int = pool_max_sockets) -> None:
+        """Initialize an empty pool whose listeners are released after idle_timeout seconds unused.
+
+        The pool keeps at most max_sockets sockets bound, or half the open file limit if it is 0.
+        """
+        self.idle_timeout = idle_timeout
+        self.max_sockets = max_sockets or get_default_pool_size()
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._listeners: Dict[ListenerKey, List[socket.socket]] = {}
+        self._socket_count = 0
+        # Least recently used first, so the listeners to evict are at the front.
+        self._last_used: Dict[ListenerKey, float] = OrderedDict()
+        self._armed: Dict[ListenerKey, List] = {}
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="listener-pool", daemon=True)
+        self._thread.start()
+
+
+    def serve(self, protocol: str, host: str, port: int, timeout: float = LISTENER_TIMEOUT, stop: Optional[threading.Event] = None,
+              ready: Optional[threading.Event] = None) -> bool:
+        """Arm the pooled listener for host:port and wait for one probe per family or `stop`, returning False if it could not bind.
+
+        `ready` is set once the listener is armed, or failed to bind.
+        """
+        key = (protocol, host, port)
+        expected = len(get_host_families(host))
+        received = stop if stop is not None else threading.Event()
+
+        with self._lock:
+            if key in self._listeners:
+                port_logger.debug("Reusing pooled %s listener on %s:%s", protocol.upper(), host, port)
+            elif self._make_room(expected):
+                try:
+                    self._add_listener(key)
+                except OSError as e:
+                    if not is_out_of_descriptors(e):
+                        port_logger.error("Could not bind pooled %s listener on %s:%s: %s", protocol.upper(), host, port, e)
+                        return False
+                    # Probes and API requests need descriptors too, so give back every idle listener.
+                    port_logger.warning("Out of file descriptors with %s pooled sockets, releasing the idle ones.", self._socket_count)
+                    self._make_room(self.max_sockets)
+
+            pooled = key in self._listeners
+            if pooled:
+                self._armed[key] = [expected, received]
+                self._touch(key)
+
+        if not pooled:
+            port_logger.debug("Listener pool full, serving %s on %s:%s without pooling", protocol.upper(), host, port)
+            return start_server(protocol, host, port, timeout, stop, ready)
+
+        if ready is not None:
+            ready.set()
+        if not received.wait(timeout):
+            port_logger.warning("%s server on %s:%s timed out after %s seconds", protocol.upper(), host, port, timeout)
+
+        with self._lock:
+            self._armed.pop(key, None)
+            if key in self._listeners:
+                self._touch(key)
+
+        return True
+
+
+    def close(self) -> None:
+        """Stop the pool thread and release every pooled listener."""
+        self._running = False
+        self._wakeup_w.send(b"\0")
+        self._thread.join()
+
+        with self._lock:
+            for key in list(self._listeners):
+                self._remove_listener(key)
+        self._selector.close()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+        logging.info("Listener pool closed.")
+
+
+    def _add_listener(self, key: ListenerKey) -> None:
+        """Bind the sockets for a key and hand them to the pool thread. Caller holds the lock."""
+        protocol, host, port = key
+        port_logger.info("Binding pooled %s listener on %s:%s", protocol.upper(), host, port)
+        sockets = create_listening_sockets(protocol, host, port)
+        for sock in sockets:
+            sock.setblocking(False)
+            self._selector.register(sock, selectors.EVENT_READ, key)
+        self._listeners[key] = sockets
+        self._socket_count += len(sockets)
+        self._wakeup_w.send(b"\0")
+
+
+    def _remove_listener(self, key: ListenerKey) -> None:
+        """Unregister and close the sockets for a key. Caller holds the lock."""
+        for sock in self._listeners.pop(key, []):
+            self._selector.unregister(sock)
+            sock.close()
+            self._socket_count -= 1
+        self._last_used.pop(key, None)
+
+
+    def _touch(self, key: ListenerKey) -> None:
+        """Mark a listener as the most recently used. Caller holds the lock."""
+        self._last_used[key] = time.monotonic()
+        self._last_used.move_to_end(key)
+
+
+    def _make_room(self, needed: int) -> bool:
+        """Release the least recently used idle listeners until `needed` more sockets fit, returning False if they cannot. Caller holds the lock."""
+        for key in list(self._last_used):
+            if self._socket_count + needed <= self.max_sockets:
+                break
+            if key not in self._armed:
+                port_logger.debug("Evicting pooled %s listener on %s:%s to stay within %s sockets", key[0].upper(), key[1], key[2], self.max_sockets)
+                self._remove_listener(key)
+        return self._socket_count + needed <= self.max_sockets
+
+
+    def _run(self) -> None:
+        """Answer probes on every pooled listener and release the ones left idle too long."""
+        while self._running:
+            events = self._selector.select(timeout=1)
+
+            for selector_key, _ in events:
+                if selector_key.data is None:
+                    self._wakeup_r.recv(1024)
+                    continue
+                self._handle_probe(selector_key.data, selector_key.fileobj)
+
+            self._release_idle()
+
+
+    def _handle_probe(self, key: ListenerKey, sock: socket.socket) -> None:
+        """Answer a probe and count it toward the run that armed the listener."""
+        try:
+            answer_probe(key[0], sock)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            port_logger.error("Socket error in pooled listener on %s:%s: %s", key[1], key[2], e)
+            return
+
+        with self._lock:
+            armed = self._armed.get(key)
+            if armed is None:
+                port_logger.debug("Probe on unarmed pooled listener %s:%s ignored", key[1], key[2])
+                return
+            armed[0] -= 1
+            if armed[0] <= 0:
+                armed[1].set()
+
+
+    def _release_idle(self) -> None:
+        """Close listeners that have not been armed within the idle timeout."""
+        now = time.monotonic()
+        with self._lock:
+            for key, last_used in list(self._last_used.items()):
+                if key not in self._armed and now - last_used > self.idle_timeout:
+                    logging.info("Releasing idle pooled %s listener on %s:%s", key[0].upper(), key[1], key[2])
+                    self._remove_listener(key)
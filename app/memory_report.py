@@ -0,0 +1,162 @@
+import inspect
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import psutil
+
+SUBSYSTEMS = ('engine', 'table', 'logging', 'other')
+TRACE_FRAMES = 16
+PEAK_POLL_INTERVAL = 0.1
+PEAK_GROWTH = 1.1
+TOP_SITES = 5
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(REPO_ROOT, 'app')
+UI_DIR = os.path.join(REPO_ROOT, 'ui')
+LOGGING_DIRS = (os.path.dirname(logging.__file__), os.path.join(REPO_ROOT, 'config'))
+
+Checkpoint = Tuple[tracemalloc.Snapshot, int]
+
+
+def get_peak_rss() -> int:
+    """Return the peak resident set size of the process in bytes, or the current one where the OS keeps no peak."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss)
+
+
+class MemoryReport:
+    """Take tracemalloc snapshots at scan start, at the traced-memory peak and at scan end, and report them per subsystem."""
+
+    def __init__(self, path: str) -> None:
+        """Initialize the report written to path."""
+        self.path = path
+        self.checkpoints: Dict[str, Checkpoint] = {}
+        self._peak_size = 0
+        self._table_file: Optional[str] = None
+        self._table_lines: Optional[List[range]] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._watch_peak, name='memory-report', daemon=True)
+
+
+    def start(self) -> None:
+        """Start tracing allocations and watching for the peak."""
+        tracemalloc.start(TRACE_FRAMES)
+        self._sampler.start()
+
+
+    def checkpoint(self, name: str, replace: bool = True) -> None:
+        """Snapshot the traced allocations under a name, keeping an existing snapshot unless replace is set."""
+        with self._lock:
+            if replace or name not in self.checkpoints:
+                self.checkpoints[name] = (tracemalloc.take_snapshot(), psutil.Process().memory_info().rss)
+
+
+    def _watch_peak(self) -> None:
+        """Snapshot again whenever traced memory grows clearly beyond the last peak snapshot."""
+        while not self._stopped.wait(PEAK_POLL_INTERVAL):
+            current, _ = tracemalloc.get_traced_memory()
+            if current > self._peak_size * PEAK_GROWTH:
+                self._peak_size = current
+                self.checkpoint('peak')
+
+
+    def stop(self) -> None:
+        """Stop tracing and write the report."""
+        self._stopped.set()
+        self._sampler.join()
+        peak_traced = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(f"Port Knocker memory report, {datetime.now().isoformat(timespec='seconds')}\n\n")
+                f.write(f"Peak traced Python memory: {peak_traced / 1024:.1f} KiB\n")
+                f.write(f"Peak RSS: {get_peak_rss() / 1024:.1f} KiB\n")
+                f.write("Qt widgets and items live in C++ memory: they count in RSS but not in the traced sizes.\n")
+
+                for name in ('scan start', 'peak', 'scan end'):
+                    if name in self.checkpoints:
+                        f.write(self.format_checkpoint(name, *self.checkpoints[name]))
+            logging.info("Memory report written to %s.", self.path)
+        except OSError as e:
+            logging.error("Could not write the memory report to %s: %s", self.path, e)
+
+
+    def format_checkpoint(self, name: str, snapshot: tracemalloc.Snapshot, rss: int) -> str:
+        """Summarize a snapshot: traced size per subsystem and its largest allocation sites."""
+        totals = dict.fromkeys(SUBSYSTEMS, 0)
+        sites: Dict[str, Dict[str, int]] = { subsystem: {} for subsystem in SUBSYSTEMS }
+
+        for statistic in snapshot.statistics('traceback'):
+            subsystem, site = self.classify(statistic.traceback)
+            totals[subsystem] += statistic.size
+            sites[subsystem][site] = sites[subsystem].get(site, 0) + statistic.size
+
+        lines = [f"\n== {name}: RSS {rss / 1024:.1f} KiB, traced {sum(totals.values()) / 1024:.1f} KiB ==\n"]
+        for subsystem in SUBSYSTEMS:
+            lines.append(f"{subsystem:<8}{totals[subsystem] / 1024:>12.1f} KiB\n")
+            top = sorted(sites[subsystem].items(), key=lambda item: -item[1])[:TOP_SITES]
+            for site, size in top:
+                lines.append(f"    {size / 1024:>10.1f} KiB  {site}\n")
+        return "".join(lines)
+
+
+    def classify(self, traceback: tracemalloc.Traceback) -> Tuple[str, str]:
+        """Attribute an allocation to a subsystem and a site from its traceback, most recent frame first."""
+        innermost = traceback[-1]
+        if innermost.filename.startswith(LOGGING_DIRS):
+            return 'logging', f"{innermost.filename}:{innermost.lineno}"
+
+        for frame in reversed(traceback):
+            if frame.filename.startswith((APP_DIR, UI_DIR)):
+                site = f"{os.path.relpath(frame.filename, REPO_ROOT)}:{frame.lineno}"
+                if frame.filename.startswith(UI_DIR) or self._is_table_frame(frame):
+                    return 'table', site
+                return 'engine', site
+        return 'other', f"{innermost.filename}:{innermost.lineno}"
+
+
+    def _is_table_frame(self, frame: tracemalloc.Frame) -> bool:
+        """Tell whether a frame runs MainWindow or TableUpdater code, which own the table."""
+        if self._table_lines is None:
+            from app.port_knocker import MainWindow, TableUpdater
+            self._table_file = inspect.getsourcefile(MainWindow)
+            self._table_lines = []
+            for cls in (MainWindow, TableUpdater):
+                source, first_line = inspect.getsourcelines(cls)
+                self._table_lines.append(range(first_line, first_line + len(source)))
+        return frame.filename == self._table_file and any(frame.lineno in lines for lines in self._table_lines)
+
+
+_report: Optional[MemoryReport] = None
+
+
+def start_memory_report(path: str) -> None:
+    """Start tracing allocations, writing the report to path on stop_memory_report()."""
+    global _report
+    _report = MemoryReport(path)
+    _report.start()
+
+
+def stop_memory_report() -> None:
+    """Write the memory report, if one was started."""
+    global _report
+    if _report is not None:
+        _report.stop()
+        _report = None
+
+
+def memory_checkpoint(name: str, replace: bool = True) -> None:
+    """Snapshot allocations under a name when a memory report is running."""
+    if _report is not None:
+        _report.checkpoint(name, replace)
@@ -1,10 +1,63 @@
+import os
+import ipaddress
+import logging
 import psutil
 import socket
-from typing import List
+from typing import Dict, List
+from app.port_set import PortSet
 
-def get_local_ips(exclude_list: List[str] = ['127.0.0.1']) -> List[str]:
+DUAL_STACK_HOST = '::'
+ADDRESS_FAMILIES = ('ipv4', 'ipv6')
+WILDCARD_HOSTS = ('0.0.0.0', '::')
+
+
+def get_local_ips(exclude_list: List[str] = ['127.0.0.1', '::1'], include_ipv6: bool = True) -> List[str]:
     """Retrieve a list of local IP addresses, excluding those in the exclude list."""
     local_ips = []
+    local_ips_v6 = []
     for interface, addrs in psutil.net_if_addrs().items():
         local_ips.extend([addr.address for addr in addrs if addr.family == socket.AF_INET and addr.address not in exclude_list])
-    return local_ips
\ No newline at end of file
+        if include_ipv6 and socket.has_ipv6:
+            local_ips_v6.extend([addr.address for addr in addrs if addr.family == socket.AF_INET6 and is_routable_ipv6(addr.address) and addr.address not in exclude_list])
+    return local_ips + local_ips_v6
+
+
+def is_routable_ipv6(address: str) -> bool:
+    """Check if an IPv6 address can be reached from outside the local link."""
+    try:
+        ip = ipaddress.IPv6Address(address.split('%')[0])
+    except ValueError:
+        return False
+    return not (ip.is_link_local or ip.is_loopback or ip.is_multicast or ip.is_unspecified)
+
+
+def get_host_families(host: str) -> List[str]:
+    """Return the address families ('ipv4', 'ipv6') a listener bound to host can verify."""
+    if host == DUAL_STACK_HOST:
+        return list(ADDRESS_FAMILIES)
+    return ['ipv6'] if ':' in host else ['ipv4']
+
+
+def get_local_listeners(host: str) -> Dict[str, PortSet]:
+    """Take one snapshot of the sockets other processes listen on and index the ports that clash with host."""
+    ports = { 'tcp': [], 'udp': [] }
+    try:
+        connections = psutil.net_connections(kind='inet')
+    except (psutil.AccessDenied, OSError) as e:
+        logging.warning("Could not list local listening sockets: %s", e)
+        return { protocol: PortSet() for protocol in ports }
+
+    own_pid = os.getpid()
+    for conn in connections:
+        if not conn.laddr or conn.pid == own_pid:
+            continue
+        if conn.type == socket.SOCK_STREAM and conn.status == psutil.CONN_LISTEN:
+            protocol = 'tcp'
+        elif conn.type == socket.SOCK_DGRAM and not conn.raddr:
+            protocol = 'udp'
+        else:
+            continue
+        if host in WILDCARD_HOSTS or conn.laddr.ip in WILDCARD_HOSTS or conn.laddr.ip == host:
+            ports[protocol].append(conn.laddr.port)
+
+    return { protocol: PortSet.from_ports(found) for protocol, found in ports.items() }
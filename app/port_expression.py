@@ -0,0 +1,85 @@
+import re
+from typing import Dict, List
+from app.port_set import Interval, PortSet
+
+MIN_PORT = 1
+MAX_PORT = 65535
+PROTOCOLS = ('tcp', 'udp')
+
+PORT_PROFILES = {
+    'all': '1-65535',
+    'well-known': '1-1023',
+    'ssh': 'tcp:22',
+    'dns': 'tcp:53,udp:53',
+    'web': 'tcp:80,tcp:443,tcp:8080,tcp:8443',
+    'mail': 'tcp:25,tcp:110,tcp:143,tcp:465,tcp:587,tcp:993,tcp:995',
+    'rdp': 'tcp:3389,udp:3389',
+    'openvpn': 'udp:1194,tcp:1194',
+    'wireguard': 'udp:51820',
+    'minecraft': 'tcp:25565,udp:19132',
+    'plex': 'tcp:32400',
+}
+
+_TERM_PATTERN = re.compile(r'^(?:(?P<protocol>[a-z]+):)?(?P<item>[a-z0-9_-]+)$')
+
+
+class PortExpressionError(ValueError):
+    """Raised when a port expression cannot be parsed."""
+
+
+def parse_port_expression(expression: str, default_protocol: str = 'tcp', _depth: int = 0) -> Dict[str, PortSet]:
+    """Parse an expression such as 'tcp:22,80-90,!85,udp:dns' into a port set per protocol.
+
+    Terms are comma separated and may be a port, a 'start-end' range or a profile name from
+    PORT_PROFILES, optionally prefixed by 'tcp:' or 'udp:'. A prefixed profile keeps only the
+    ports of that protocol. Terms starting with '!' are excluded from the result regardless
+    of where they appear.
+    """
+    if _depth > len(PORT_PROFILES):
+        raise PortExpressionError("Port profiles reference each other in a loop.")
+
+    included = { protocol: [] for protocol in PROTOCOLS }
+    excluded = { protocol: [] for protocol in PROTOCOLS }
+
+    for term in expression.lower().replace(' ', '').split(','):
+        if not term:
+            continue
+
+        target = included
+        if term.startswith('!'):
+            target = excluded
+            term = term[1:]
+
+        match = _TERM_PATTERN.match(term)
+        if not match:
+            raise PortExpressionError(f"Invalid port expression term: '{term}'.")
+
+        protocol = match.group('protocol') or default_protocol
+        if protocol not in PROTOCOLS:
+            raise PortExpressionError(f"Invalid protocol: '{protocol}'. Use tcp or udp.")
+
+        for term_protocol, intervals in parse_port_item(match.group('item'), protocol, _depth).items():
+            if match.group('protocol') and term_protocol != protocol:
+                continue
+            target[term_protocol].extend(intervals)
+
+    return { protocol: PortSet(included[protocol]) - PortSet(excluded[protocol]) for protocol in PROTOCOLS }
+
+
+def parse_port_item(item: str, protocol: str, depth: int) -> Dict[str, List[Interval]]:
+    """Turn a single port, range or profile name into intervals for the given protocol."""
+    if item in PORT_PROFILES:
+        ports = parse_port_expression(PORT_PROFILES[item], protocol, depth + 1)
+        return { p: ports[p].intervals for p in PROTOCOLS }
+
+    bounds = item.split('-')
+    if len(bounds) > 2 or not all(bound.isdigit() for bound in bounds):
+        raise PortExpressionError(f"Unknown port or profile: '{item}'.")
+
+    start, end = int(bounds[0]), int(bounds[-1])
+    if start < MIN_PORT or end > MAX_PORT or start > end:
+        raise PortExpressionError(f"Invalid port range: {start}-{end}. Ports must be between {MIN_PORT}-{MAX_PORT}, and start must not exceed end.")
+
+    result = { p: [] for p in PROTOCOLS }
+    result[protocol].append((start, end))
+    return result
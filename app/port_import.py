@@ -0,0 +1,77 @@
+import csv
+import re
+import logging
+from typing import Dict, List, Optional, Tuple
+from app.port_set import PortSet
+from app.port_expression import PROTOCOLS, parse_port_expression
+
+_NMAP_SERVICE_LINE = re.compile(r'^\S+\s+(\d+)/(tcp|udp)\s+([0-9.]+)')
+
+
+def is_nmap_services_file(path: str, sample_lines: int = 50) -> bool:
+    """Check whether a file looks like nmap-services ('name port/proto frequency')."""
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for _, line in zip(range(sample_lines), f):
+                if _NMAP_SERVICE_LINE.match(line):
+                    return True
+    except OSError:
+        return False
+    return False
+
+
+def parse_nmap_services(path: str, top: Optional[int] = None) -> Dict[str, PortSet]:
+    """Read an nmap-services file, keeping the top most frequent ports per protocol when top is set."""
+    entries: Dict[str, List[Tuple[float, int]]] = { protocol: [] for protocol in PROTOCOLS }
+
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = _NMAP_SERVICE_LINE.match(line)
+            if match:
+                port, protocol, frequency = int(match.group(1)), match.group(2), float(match.group(3))
+                entries[protocol].append((frequency, port))
+
+    result = {}
+    for protocol, ports in entries.items():
+        if top:
+            ports = sorted(ports, key=lambda entry: -entry[0])[:top]
+        result[protocol] = PortSet.from_ports(port for _, port in ports)
+    return result
+
+
+def parse_port_list(path: str, default_protocol: str = 'tcp') -> Dict[str, PortSet]:
+    """Read a text or CSV port list into port sets.
+
+    Every line may hold port expressions separated by commas, whitespace or semicolons, and
+    '#' starts a comment. A CSV file whose header has a 'port' column is read by column,
+    with an optional 'protocol' column.
+    """
+    with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        first_line = f.readline()
+        f.seek(0)
+        header = [field.strip().lower() for field in next(csv.reader([first_line]), [])]
+
+        if 'port' in header:
+            expressions = [
+                f"{(row.get('protocol') or default_protocol).strip().lower()}:{row['port'].strip()}"
+                for row in csv.DictReader(f, fieldnames=header)
+                if row.get('port') and row['port'].strip().lower() != 'port'
+            ]
+        else:
+            expressions = []
+            for line in f:
+                line = line.split('#', 1)[0]
+                expressions.extend(term for term in re.split(r'[\s,;]+', line) if term)
+
+    return parse_port_expression(",".join(expressions), default_protocol)
+
+
+def import_ports(path: str, default_protocol: str = 'tcp', top: Optional[int] = None) -> Dict[str, PortSet]:
+    """Import ports from an nmap-services file or a text/CSV port list."""
+    if is_nmap_services_file(path):
+        ports_list = parse_nmap_services(path, top)
+    else:
+        ports_list = parse_port_list(path, default_protocol)
+
+    logging.info("Imported %s ports from %s.", sum(len(ports) for ports in ports_list.values()), path)
+    return ports_list
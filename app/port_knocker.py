@@ -1,102 +1,337 @@
 import threading
+import time
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterable, List, Set, Tuple, Optional
 from PySide6 import QtWidgets, QtCore, QtGui
 from PySide6.QtGui import QShortcut, QKeySequence
 from ui.window_ui import Ui_MainWindow
-from app.port_utils import start_server, handle_port_status, PortsList, PortsStatus
-from app.network_utils import get_local_ips
-from app.port_validator import is_port_range_and_valid, is_port_valid
+from app.port_utils import start_server, handle_port_status, scan_concurrency, history_file, max_table_ports, local_conflict_mode, PortsList
+from app.listener_pool import ListenerPool, pool_enabled
+from app.network_utils import DUAL_STACK_HOST, get_local_ips, get_host_families, get_local_listeners
+from app.port_expression import PortExpressionError, parse_port_expression
+from app.port_set import PortSet
+from app.scan_plan import PortKey, ScanHistory, plan_scan
+from app.result_store import ResultStore
+from app.exporters import ResultExporter, open_exporter
+from app.port_import import import_ports, is_nmap_services_file
+from app.profiler import profile_phase, profile_thread, record_phase
+from app.tracer import trace_span
+from app.memory_report import memory_checkpoint
+from app.progress import ScanProgress, format_duration
+from app.run_diff import RunDiff, RunStatuses, combine_statuses, log_diff, statuses_from_history, statuses_from_store
+from config.logging_config import flush_log_summary
+
+REFRESH_INTERVAL_MS = 33
+FRAME_BUDGET = 0.012
+REFRESH_CHUNK = 256
+PROGRESS_REFRESH_MS = 500
 
 
 class Worker(QtCore.QObject):
-    finished = QtCore.Signal(dict)
+    finished = QtCore.Signal(object)
 
-    def __init__(self, ports_list: PortsList, host: str) -> None:
-        """Initialize the Worker with a ports list and host."""
+    def __init__(self, ports_list: PortsList, host: str, listener_pool: Optional[ListenerPool] = None,
+                 history: Optional[ScanHistory] = None, max_concurrency: int = scan_concurrency,
+                 exporter: Optional[ResultExporter] = None, progress: Optional[ScanProgress] = None) -> None:
+        """Initialize the Worker with a ports list, host and optional listener pool, scan history, exporter and progress."""
         super().__init__()
         self.ports_list = ports_list
         self.host = host
-        self.ports_status = {
-            'open': { 'tcp': [], 'udp': [] },
-            'closed': { 'tcp': [], 'udp': [] }
-        }
+        self.listener_pool = listener_pool
+        self.history = history
+        self.exporter = exporter
+        self.max_concurrency = max_concurrency
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.families = get_host_families(host)
+        self.results = ResultStore(self.families)
+        self.local_listeners = { 'tcp': PortSet(), 'udp': PortSet() }
+        self.progress = progress if progress is not None else ScanProgress(sum(len(ports) for ports in ports_list.values()))
+        self.created_at = time.perf_counter()
         self._running = True
 
 
     @QtCore.Slot()
     def run(self) -> None:
-        """Start the worker threads for handling server and request processing."""
+        """Check every port in planned order, keeping at most max_concurrency ports in flight."""
         logging.info("Worker started.")
-        server_threads_all  = []
-        request_threads_all = []
+        memory_checkpoint('scan start', replace=False)
 
-        try:
-            for protocol, ports in self.ports_list.items():
-                if not self._running:
-                    break
-                
-                server_threads, request_threads = self.create_and_start_threads(protocol, ports)
+        with profile_thread():
+            try:
+                self.local_listeners = get_local_listeners(self.host)
+                in_use = sum(len(self.local_listeners[protocol] & ports) for protocol, ports in self.ports_list.items())
+                if in_use:
+                    logging.info("%s ports are already in use locally and will be %s.", in_use, "checked against the existing listener" if local_conflict_mode == 'check' else "skipped")
+
+                dispatched_at = None
+                for protocol, port in plan_scan(self.ports_list, self.history, self.local_listeners):
+                    self.slots.acquire()
+                    if not self._running:
+                        self.slots.release()
+                        break
+
+                    if dispatched_at is None:
+                        dispatched_at = time.perf_counter()
+                        record_phase('engine start', dispatched_at - self.created_at)
+                    self.progress.port_started()
+                    threading.Thread(target=self.check_port, args=(protocol, port)).start()
+
+                for _ in range(self.max_concurrency):
+                    self.slots.acquire()
+
+                if dispatched_at is not None:
+                    record_phase('verdict wait', time.perf_counter() - dispatched_at)
+
+            except Exception as e:
+                logging.error("Error in Worker run method: %s", e)
+
+        flush_log_summary()
+        memory_checkpoint('scan end')
+        logging.info("Worker finished.")
+        self.finished.emit(self.results)
 
-                if not self._running:
-                    break
 
-                server_threads_all.extend(server_threads)
-                request_threads_all.extend(request_threads)
+    def check_port(self, protocol: str, port: int) -> None:
+        """Run the listener and one verdict request per family for a port, then report its result."""
+        bound = []
+        start = time.perf_counter()
+        in_use = port in self.local_listeners[protocol]
 
-            self.join_threads(server_threads_all, request_threads_all)
+        try:
+            if in_use and local_conflict_mode != 'check':
+                for family in self.families:
+                    self.results.set_status(family, protocol, port, 'in_use')
+            else:
+                server_thread = None
+                verdicts_done = threading.Event()
+                if in_use:
+                    # The process already bound to the port answers the probe.
+                    bound = [True]
+                else:
+                    listening = threading.Event()
+                    server_thread = threading.Thread(target=lambda: bound.append(self.run_server(protocol, port, verdicts_done, listening)))
+                    server_thread.start()
+                    # A probe sent before bind() completes is refused, and the port would be reported closed.
+                    listening.wait()
+
+                request_threads = [
+                    threading.Thread(target=handle_port_status, args=(protocol, port, self.results, family, self.host))
+                    for family in self.families
+                ]
+                for thread in request_threads:
+                    thread.start()
+
+                for thread in request_threads:
+                    thread.join()
+                # Every family has its verdict, so a closed port need not hold its slot until the listener times out.
+                verdicts_done.set()
+                if server_thread is not None:
+                    server_thread.join()
+
+                if bound != [True]:
+                    for family in self.families:
+                        self.results.set_status(family, protocol, port, 'bind_error')
+
+            verdicts = {}
+            latencies = {}
+            for family in self.families:
+
+                status = self.results.status(family, protocol, port)
+                if status != 'pending':
+                    verdicts[family] = status
+                    self.results.complete(family, protocol, port)
+
+                latency = self.results.latency(family, protocol, port)
+                if latency is not None:
+                    latencies[family] = latency
+
+            if self.history is not None and verdicts:
+                self.history.record(protocol, port, combine_statuses(verdicts.values()), max(latencies.values(), default=None))
+
+            if self.exporter is not None:
+                self.exporter.write_port(self.host, protocol, port, verdicts, latencies, time.perf_counter() - start)
 
         except Exception as e:
-            logging.error(f"Error in Worker run method: {e}")
+            logging.error("Error checking %s port %s: %s", protocol.upper(), port, e)
+        finally:
+            self.progress.port_finished()
+            self.slots.release()
 
-        logging.info("Worker finished.")
-        self.finished.emit(self.ports_status)
 
+    def run_server(self, protocol: str, port: int, stop: threading.Event, ready: threading.Event) -> bool:
+        """Run the listener for a port until it times out or `stop` is set, returning False if it could not bind.
+
+        `ready` is set once the listener is bound, or on any failure, so the caller never waits for it forever.
+        """
+        try:
+            with trace_span(f"listen {protocol}/{port}", protocol, 'listener', port=port, pooled=bool(self.listener_pool)):
+                if self.listener_pool:
+                    return self.listener_pool.serve(protocol, self.host, port, stop=stop, ready=ready)
+                return start_server(protocol, self.host, port, stop=stop, ready=ready)
+        finally:
+            ready.set()
+
+
+    def stop(self) -> None:
+        """Stop the worker by setting the running flag to False."""
+        self._running = False
 
-    def create_and_start_threads(self, protocol: str, ports: List[int]) -> Tuple[List[threading.Thread], List[threading.Thread]]:
-        """Create and start server and request threads for the given protocol and ports."""
-        server_threads  = []
-        request_threads = []
 
+
+class ImportWorker(QtCore.QObject):
+    finished = QtCore.Signal(dict)
+
+    def __init__(self, path: str, protocol: str, top: Optional[int] = None) -> None:
+        """Initialize the ImportWorker with a file path, default protocol and optional top-N limit."""
+        super().__init__()
+        self.path = path
+        self.protocol = protocol
+        self.top = top
+
+
+    @QtCore.Slot()
+    def run(self) -> None:
+        """Parse and dedupe the file, emitting an empty dict on failure."""
         try:
-            for port in ports:
-                server_thread = threading.Thread(target=start_server, args=(protocol, self.host, port))
-                server_threads.append(server_thread)
-                server_thread.start()
-
-                request_thread = threading.Thread(target=handle_port_status, args=(protocol, port, self.ports_status))
-                request_threads.append(request_thread)
-                request_thread.start()
-        except Exception as e:
-            logging.error(f"Error starting server or request thread for {protocol.upper()} on port {port}: {e}")
+            with profile_phase('validation'):
+                ports_list = import_ports(self.path, self.protocol, self.top)
+        except (OSError, PortExpressionError) as e:
+            logging.error("Error importing ports from %s: %s", self.path, e)
+            ports_list = {}
+        self.finished.emit(ports_list)
 
-        return server_threads, request_threads
-    
 
-    def join_threads(self, server_threads: List[threading.Thread], request_threads: List[threading.Thread]) -> None:
-        """Join all threads to ensure they complete before proceeding."""
-        for thread in request_threads:
-            thread.join()
 
-        for thread in server_threads:
-            thread.join()
+class TableUpdater(QtCore.QObject):
+    def __init__(self, table: QtWidgets.QTableWidget, rows: Dict[PortKey, int]) -> None:
+        """Initialize the updater for the status column of table, whose rows are indexed by (protocol, port)."""
+        super().__init__()
+        self.table = table
+        self.rows = rows
+        self.results: Optional[ResultStore] = None
+        self.unanswered: Set[PortKey] = set()
+        self._cursor = 0
+        self._pending: Dict[PortKey, None] = {}
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(REFRESH_INTERVAL_MS)
+        self._timer.timeout.connect(self.refresh)
+
+
+    def start(self, results: ResultStore) -> None:
+        """Start applying the results of a new scan, about 30 times per second."""
+        self.results = results
+        self.unanswered = set(self.rows)
+        self._cursor = 0
+        self._pending = {}
+        self._timer.start()
 
 
     def stop(self) -> None:
-        """Stop the worker by setting the running flag to False."""
-        self._running = False
+        """Stop the timer and apply every result still waiting, whatever the frame budget."""
+        self._timer.stop()
+        if self.results is not None:
+            self.refresh(None)
+
+
+    @QtCore.Slot()
+    def refresh(self, budget: Optional[float] = FRAME_BUDGET) -> None:
+        """Apply the ports completed since the last frame, in chunks, until the frame budget is spent."""
+        self._cursor, completed = self.results.read_new(self._cursor)
+        for _, protocol, port, _ in completed:
+            self._pending[(protocol, port)] = None
+        if not self._pending:
+            return
+
+        with profile_phase('result rendering'), trace_span("refresh table", 'ui', 'ui', ports=len(self._pending)):
+            keys = list(self._pending)
+            deadline = None if budget is None else time.perf_counter() + budget
+            done = 0
+            while done < len(keys) and (deadline is None or time.perf_counter() < deadline):
+                chunk = keys[done:done + REFRESH_CHUNK]
+                self.apply([self.status_cell(key) for key in chunk if key in self.rows])
+                self.unanswered.difference_update(chunk)
+                done += len(chunk)
+            self._pending = dict.fromkeys(keys[done:])
+
+
+    def status_cell(self, key: PortKey) -> Tuple[int, str, QtGui.QBrush]:
+        """Return the row, status text and background of a port from its stored per-family verdicts."""
+        protocol, port = key
+        family_verdicts = {}
+        for family in self.results.families:
+            status = self.results.status(family, protocol, port)
+            if status != 'pending':
+                family_verdicts[family] = status
+        statuses = set(family_verdicts.values())
+
+        if len(family_verdicts) == 1:
+            text = self.format_status(next(iter(statuses)))
+        else:
+            text = " / ".join(f"{family.upper()} {self.format_status(status)}" for family, status in sorted(family_verdicts.items()))
+
+        if statuses == {"open"}:
+            color = QtGui.QColor("green")
+        elif "open" in statuses:
+            color = QtGui.QColor("orange")
+        elif statuses & {"bind_error", "in_use"}:
+            color = QtGui.QColor("gray")
+        else:
+            color = QtGui.QColor("red")
+        return self.rows[key], text, QtGui.QBrush(color)
+
+
+    def apply(self, cells: List[Tuple[int, str, QtGui.QBrush]]) -> None:
+        """Set the status text and background of many rows behind a single model change notification."""
+        if not cells:
+            return
+
+        model = self.table.model()
+        model.blockSignals(True)
+        try:
+            for row, text, brush in cells:
+                item = self.table.item(row, 3)
+                item.setText(text)
+                item.setBackground(brush)
+        finally:
+            model.blockSignals(False)
+
+        rows = [row for row, _, _ in cells]
+        model.dataChanged.emit(model.index(min(rows), 3), model.index(max(rows), 3))
+
+
+    @staticmethod
+    def format_status(status: str) -> str:
+        """Turn a result state such as 'bind_error' into table text."""
+        if status == 'in_use':
+            return "In use locally"
+        return status.replace('_', ' ').capitalize()
 
 
 
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self) -> None:
-        """Initialize the MainWindow and set up UI components."""
+    def __init__(self, export_path: Optional[str] = None, export_format: Optional[str] = None, export_gzip: Optional[bool] = None) -> None:
+        """Initialize the MainWindow and set up UI components, optionally exporting every run's results."""
         super().__init__()
 
-        self.ports_list = { 'tcp': [], 'udp': [] }
+        self.export_path = export_path
+        self.export_format = export_format
+        self.export_gzip = export_gzip
+        self.exporter = None
+
+        self.ports_list = { 'tcp': PortSet(), 'udp': PortSet() }
+        self.rows: Dict[PortKey, int] = {}
 
         self.thread = None
         self.worker = None
+        self.import_thread = None
+        self.import_worker = None
+        self.listener_pool = ListenerPool() if pool_enabled else None
+        self.history = ScanHistory()
+        if history_file:
+            self.history.load(history_file)
+        self.last_run: Optional[RunStatuses] = None
+        self.baseline: Optional[RunStatuses] = None
+        self.highlighted_ports: List[Tuple[str, int]] = []
 
         self.setWindowIcon(QtGui.QIcon(":icon.ico"))
         self.setWindowTitle("Port Knocker")
@@ -110,6 +345,12 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.tableWidget.horizontalHeader().setStretchLastSection(True)
         self.ui.tableWidget.verticalHeader().setVisible(False)
         self.ui.tableWidget.setColumnWidth(0, 30)
+        self.ui.tableWidget.cellClicked.connect(self.handle_cell_clicked)
+        self.table_updater = TableUpdater(self.ui.tableWidget, self.rows)
+
+        self.progress_timer = QtCore.QTimer(self)
+        self.progress_timer.setInterval(PROGRESS_REFRESH_MS)
+        self.progress_timer.timeout.connect(self.show_progress)
 
         self.ui.comboBox.activated.connect(self.keep_focus)
         self.ui.comboBox_2.activated.connect(self.keep_focus)
@@ -124,6 +365,16 @@ class MainWindow(QtWidgets.QMainWindow):
         shortcut_f5 = QShortcut(QKeySequence("F5"), self)
         shortcut_f5.activated.connect(self.start_port_checking)
 
+        shortcut_import = QShortcut(QKeySequence("Ctrl+O"), self)
+        shortcut_import.activated.connect(self.import_ports_from_file)
+
+
+    def closeEvent(self, event: QtGui.QCloseEvent) -> None:
+        """Release the warm listener pool, if any, when the window closes."""
+        if self.listener_pool:
+            self.listener_pool.close()
+        super().closeEvent(event)
+
 
     def keep_focus(self) -> None:
         """Set focus to the input line edit."""
@@ -134,6 +385,8 @@ class MainWindow(QtWidgets.QMainWindow):
         """Populate the local IP combo box with available IPs."""
         local_ips = get_local_ips()
         self.ui.comboBox_2.addItems(local_ips)
+        if any(':' in ip for ip in local_ips):
+            self.ui.comboBox_2.addItem(DUAL_STACK_HOST)
 
 
     def setup_protocol_combo_box(self) -> None:
@@ -144,16 +397,32 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def populate_table(self) -> None:
         """Populate the table with ports from the ports list."""
-        for protocol, ports in self.ports_list.items():
-            for port in ports:
-                self.insert_port_row(protocol.upper(), port)
+        self.insert_port_rows((protocol.upper(), port) for protocol, ports in self.ports_list.items() for port in ports)
 
 
     def insert_port_row(self, protocol: str, port: int) -> None:
         """Insert a new row in the table for the specified protocol and port."""
-        row_position = self.ui.tableWidget.rowCount()
-        self.ui.tableWidget.insertRow(row_position)
+        self.insert_port_rows([(protocol, port)])
+
+
+    def insert_port_rows(self, rows: Iterable[Tuple[str, int]]) -> None:
+        """Append rows for (protocol, port) pairs with a single resize and one repaint."""
+        rows = list(rows)
+        table = self.ui.tableWidget
+        first_row = table.rowCount()
+
+        with profile_phase('table population'):
+            table.setUpdatesEnabled(False)
+            try:
+                table.setRowCount(first_row + len(rows))
+                for offset, (protocol, port) in enumerate(rows):
+                    self.fill_port_row(first_row + offset, protocol, port)
+            finally:
+                table.setUpdatesEnabled(True)
+
 
+    def fill_port_row(self, row_position: int, protocol: str, port: int) -> None:
+        """Fill an existing, empty table row for the specified protocol and port."""
         port_item = QtWidgets.QTableWidgetItem(str(port))
         port_item.setTextAlignment(QtCore.Qt.AlignCenter)
 
@@ -164,81 +433,119 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.tableWidget.setItem(row_position, 2, protocol_item)
         self.ui.tableWidget.setItem(row_position, 3, QtWidgets.QTableWidgetItem("Pending"))
 
-        remove_button = QtWidgets.QPushButton("🗑️")
-        remove_button.setStyleSheet("""
-            QPushButton {
-                background-color: transparent;
-                border: none;
-                color: black; /* Default text color */
-            }
-            QPushButton:hover {
-                background-color: red; /* Color on hover */
-                color: white; /* Text color on hover */
-            }
-        """)
-        remove_button.clicked.connect(lambda checked: self.remove_port(row_position))
+        # A plain item instead of a QPushButton per row keeps bulk inserts fast.
+        remove_item = QtWidgets.QTableWidgetItem("🗑️")
+        remove_item.setTextAlignment(QtCore.Qt.AlignCenter)
+        remove_item.setFlags(QtCore.Qt.ItemIsEnabled)
+        remove_item.setToolTip("Remove port")
 
-        self.ui.tableWidget.setCellWidget(row_position, 0, remove_button)
+        self.ui.tableWidget.setItem(row_position, 0, remove_item)
+        self.rows[(protocol.lower(), port)] = row_position
 
 
     def add_port_or_range(self) -> None:
-        """Add a port or a range of ports to the ports list and update the table."""
-        max_allowed_port = 128
-
+        """Add the ports described by the input expression to the ports list and update the table."""
         if self.thread and self.thread.isRunning():
             logging.warning("Attempted to add port while a thread is running.")
             return
-        
-        total_port = sum(len(self.ports_list[protocol]) for protocol in self.ports_list.keys())
 
-        if total_port >= max_allowed_port:
-            logging.warning(f"Maximum allowed port in the table reached ({max_allowed_port}).")
-            return
-        
-        port = self.ui.lineEdit.text().strip()
+        expression = self.ui.lineEdit.text().strip()
         protocol = self.ui.comboBox.currentText().lower()
 
-        if is_port_range_and_valid(port):
-            port_range = port.split('-')
-            start, end = int(port_range[0]), int(port_range[1])
-            self.add_port_range_to_table(protocol, start, end)
-        elif is_port_valid(protocol, port, self.ports_list):
-            self.add_port_to_table(protocol, port)
+        try:
+            with profile_phase('validation'):
+                port_sets = parse_port_expression(expression, protocol)
+        except PortExpressionError as e:
+            logging.error("Invalid port expression '%s': %s", expression, e)
+            return
 
+        if self.add_port_sets(port_sets, f"'{expression}'"):
+            self.ui.lineEdit.clear()
+        self.keep_focus()
 
-    def add_port_range_to_table(self, protocol: str, start: int, end: int, max_range: int = 128) -> None:
-        """Add a range of ports to the table for the specified protocol."""
-        total_port = (end - start)
-        try:
-            if total_port > max_range:
-                logging.warning(f"Too many ports selected ({total_port}). The maximum allowed is {max_range}.")
+
+    def add_port_sets(self, port_sets: PortsList, source: str) -> bool:
+        """Add the ports not yet in the ports list and insert their rows in one batch."""
+        total_port = sum(len(ports) for ports in self.ports_list.values())
+
+        if total_port >= max_table_ports:
+            logging.warning("Maximum allowed port in the table reached (%s).", max_table_ports)
+            return False
+
+        new_ports = { protocol: ports - self.ports_list[protocol] for protocol, ports in port_sets.items() }
+        ports_to_add = sum(len(ports) for ports in new_ports.values())
+
+        if ports_to_add == 0:
+            logging.warning("No new ports in %s.", source)
+            return False
+
+        if total_port + ports_to_add > max_table_ports:
+            logging.warning("Too many ports selected (%s). The maximum allowed is %s.", ports_to_add, max_table_ports - total_port)
+            return False
+
+        for protocol, ports in new_ports.items():
+            self.ports_list[protocol].update(ports)
+        self.insert_port_rows((protocol.upper(), port) for protocol, ports in new_ports.items() for port in ports)
+
+        logging.info("Added %s ports from %s.", ports_to_add, source)
+        return True
+
+
+    def import_ports_from_file(self) -> None:
+        """Ask for a port list or nmap-services file and parse it on a background thread."""
+        if (self.thread and self.thread.isRunning()) or (self.import_thread and self.import_thread.isRunning()):
+            logging.warning("Attempted to import ports while a thread is running.")
+            return
+
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Import ports", "", "Port lists (*.txt *.csv *.services nmap-services);;All files (*)")
+        if not path:
+            return
+
+        top = None
+        if is_nmap_services_file(path):
+            top, ok = QtWidgets.QInputDialog.getInt(self, "Import ports", "Keep the top N ports per protocol (0 for all):", 1000, 0, 65535)
+            if not ok:
                 return
-            logging.info(f"Adding port range from {start} to {end}. Number of ports to add {end - start}.")
-            for port_nb in range(start, end + 1):
-                if is_port_valid(protocol, port_nb, self.ports_list):
-                    self.add_port_to_table(protocol, port_nb)
-        except Exception as e:
-            logging.error(f"Error adding port range: {e}")
-    
 
-    def add_port_to_table(self, protocol: str, port: str) -> None:
-        """Add a single port to the table for the specified protocol."""
-        try:
-            port = int(port)
-            self.ports_list[protocol].append(port)
-            self.insert_port_row(protocol.upper(), port)
-            self.ui.lineEdit.clear()
-            logging.info(f"Added port {port} for protocol {protocol.upper()}.")
-        except Exception as e:
-            logging.error(f"Error adding port: {e}")
-        finally:
-            self.keep_focus()
+        self.import_worker = ImportWorker(path, self.ui.comboBox.currentText().lower(), top or None)
+        self.import_worker.finished.connect(self.handle_imported_ports)
+
+        self.import_thread = QtCore.QThread()
+        self.import_worker.moveToThread(self.import_thread)
+
+        self.import_thread.started.connect(self.import_worker.run)
+        self.import_thread.start()
+
+
+    @QtCore.Slot()
+    def handle_imported_ports(self, ports_list: PortsList) -> None:
+        """Add the ports parsed by the import worker to the table."""
+        self.import_thread.quit()
+        self.import_thread.wait()
+
+        if self.thread and self.thread.isRunning():
+            # The running Worker holds the ports list, and its table updater only tracks the rows it started with.
+            logging.warning("Discarded the ports imported from %s because a scan is running.", self.import_worker.path)
+        elif ports_list:
+            self.add_port_sets(ports_list, self.import_worker.path)
+        self.keep_focus()
 
 
     def reset(self) -> None:
         """Remove all ports from table"""
+        if self.thread and self.thread.isRunning():
+            logging.warning("Attempted to reset the ports while a thread is running.")
+            return
+
         self.ui.tableWidget.setRowCount(0)
-        self.ports_list = { 'tcp': [], 'udp': [] }
+        self.rows.clear()
+        self.ports_list = { 'tcp': PortSet(), 'udp': PortSet() }
+
+
+    def handle_cell_clicked(self, row: int, column: int) -> None:
+        """Remove the port of a row when its 🗑️ cell is clicked."""
+        if column == 0:
+            self.remove_port(row)
 
 
     def remove_port(self, row: int) -> None:
@@ -255,13 +562,14 @@ class MainWindow(QtWidgets.QMainWindow):
             port = int(port_item.text())
             ports = self.ports_list[protocol]
 
-            try:
-                ports.remove(port)
+            if port in ports:
+                ports.discard(port)
                 self.ui.tableWidget.setRowCount(0)
+                self.rows.clear()
                 self.populate_table()
-                logging.info(f"Removed port {port} for protocol {protocol.upper()}.")
-            except ValueError:
-                logging.error(f"Port {port} not found in the list for protocol {protocol.upper()}")
+                logging.info("Removed port %s for protocol %s.", port, protocol.upper())
+            else:
+                logging.error("Port %s not found in the list for protocol %s", port, protocol.upper())
 
         else:
             logging.error("Protocol or port item not found in the table.")
@@ -272,19 +580,30 @@ class MainWindow(QtWidgets.QMainWindow):
     def start_port_checking(self) -> None:
         """Start the port checking process using a worker thread."""
         if self.thread and self.thread.isRunning():
-            logging.warning(f"Attempted to start port checking while a thread is running.")
+            logging.warning("Attempted to start port checking while a thread is running.")
             return
 
-        for row in range(self.ui.tableWidget.rowCount()):
-            item = self.ui.tableWidget.item(row, 3)
-            item.setText("Checking...")
-            item.setBackground(QtGui.QBrush())
-        
+        if self.import_thread and self.import_thread.isRunning():
+            logging.warning("Attempted to start port checking while ports are being imported.")
+            return
+
+        with profile_phase('table population'):
+            self.table_updater.apply([(row, "Checking...", QtGui.QBrush()) for row in range(self.ui.tableWidget.rowCount())])
+            self.clear_highlights()
+
+        # The history is updated during the run, so compare against a copy taken now.
+        self.baseline = self.last_run or statuses_from_history(self.history)
         host = self.ui.comboBox_2.currentText()
 
         try:
-            self.worker = Worker(self.ports_list, host)
+            if self.export_path:
+                self.exporter = open_exporter(self.export_path, self.export_format, self.export_gzip)
+
+            self.worker = Worker(self.ports_list, host, self.listener_pool, self.history, exporter=self.exporter)
             self.worker.finished.connect(self.handle_results)
+            self.table_updater.start(self.worker.results)
+            self.show_progress()
+            self.progress_timer.start()
 
             self.thread = QtCore.QThread()
             self.worker.moveToThread(self.thread)
@@ -293,55 +612,90 @@ class MainWindow(QtWidgets.QMainWindow):
             self.thread.start()
             logging.info("Started port checking process.")
         except Exception as e:
-            logging.error(f"Error starting port checking: {e}")
+            logging.error("Error starting port checking: %s", e)
 
 
     @QtCore.Slot()
-    def handle_results(self, ports_status: PortsStatus) -> None:
-        """Handle the results of the port checking and update the table."""
-        self.set_default_table_status()
+    def handle_results(self, results: ResultStore) -> None:
+        """Finish the port checking once every streamed result has been applied to the table."""
         try:
-            for status, protocols in ports_status.items():
-                for protocol, ports in protocols.items():
-                    self.update_ports_status(protocol, ports, status)
-
-            self.thread.quit()
-            self.thread.wait()
+            if history_file:
+                self.history.save(history_file)
+
+            if self.exporter is not None:
+                self.exporter.close()
+                self.exporter = None
+
+            self.table_updater.stop()
+            self.progress_timer.stop()
+            progress = self.worker.progress.snapshot()
+            self.ui.statusbar.showMessage(f"Checked {progress.completed} of {progress.total} ports in {format_duration(progress.elapsed)}.")
+            with profile_phase('result rendering'):
+                self.set_default_table_status()
+                self.last_run = statuses_from_store(results)
+                diff = RunDiff(self.baseline, self.last_run)
+                log_diff(diff, "the previous run")
+                self.highlight_changes(diff)
             logging.info("Port checking process completed.")
         except Exception as e:
-            logging.error(f"Error handling results: {e}")
+            logging.error("Error handling results: %s", e)
         finally:
+            # Always release the thread, or every later add, remove and start would be refused.
+            self.progress_timer.stop()
+            self.thread.quit()
+            self.thread.wait()
             self.keep_focus()
 
-        
+
+    def show_progress(self) -> None:
+        """Show the completed count, throughput, in-flight count and ETA of the running scan in the status bar."""
+        self.ui.statusbar.showMessage(str(self.worker.progress.snapshot()))
+
+
     def set_default_table_status(self) -> None:
-        """Set the default status of all ports in the table to 'Unknown'."""
-        for row in range(self.ui.tableWidget.rowCount()):
-            self.ui.tableWidget.item(row, 3).setText("Unknown")
-
-
-    def update_ports_status(self, protocol: str, ports: List[int], status: str) -> None:
-        """Update the status of ports in the table for a given protocol."""
-        for port in ports:
-            self.update_port_row(protocol, port, status)
-
-    
-    def update_port_row(self, protocol: str, port: int, status: str) -> None:
-        """Update the status of a specific port row in the table."""
-        row = self.find_port_row(protocol, port)
-        if row is not None:
-            item = self.ui.tableWidget.item(row, 3)
-            item.setText(status.capitalize())
-            color = QtGui.QColor("green") if status == "open" else QtGui.QColor("red")
-            item.setBackground(color)
-
-
-    def find_port_row(self, protocol: str, port: str) -> Optional[int]:
-        """Find the row number in the QTableWidget that corresponds to the given protocol and port."""
-        for row in range(self.ui.tableWidget.rowCount()):
-            protocol_item = self.ui.tableWidget.item(row, 2)
-            port_item = self.ui.tableWidget.item(row, 1)
-
-            if protocol_item.text().lower() == protocol and port_item.text() == str(port):
-                return row
-        return None
+        """Set the status of ports that received no verdict to 'Unknown'."""
+        rows = (self.rows.get(key) for key in self.table_updater.unanswered)
+        self.table_updater.apply([(row, "Unknown", QtGui.QBrush()) for row in rows if row is not None])
+        self.table_updater.unanswered = set()
+
+
+    def highlight_changes(self, diff: RunDiff) -> None:
+        """Mark the port cell of every row whose verdict changed since the previous run."""
+        changed = [
+            (protocol, port, change)
+            for change, by_protocol in diff.changes().items()
+            for protocol, ports in by_protocol.items()
+            for port in ports
+        ]
+        if not changed:
+            return
+
+        for protocol, port, change in changed:
+            row = self.rows.get((protocol, port))
+            if row is None:
+                continue
+            item = self.ui.tableWidget.item(row, 1)
+            font = item.font()
+            font.setBold(True)
+            item.setFont(font)
+            item.setBackground(QtGui.QColor("#fff3b0"))
+            item.setToolTip(f"{change.capitalize()} since the previous run")
+            self.highlighted_ports.append((protocol, port))
+
+
+    def clear_highlights(self) -> None:
+        """Remove the change marks left by the previous run."""
+        if not self.highlighted_ports:
+            return
+
+        for key in self.highlighted_ports:
+            row = self.rows.get(key)
+            if row is None:
+                continue
+            item = self.ui.tableWidget.item(row, 1)
+            font = item.font()
+            font.setBold(False)
+            item.setFont(font)
+            item.setBackground(QtGui.QBrush())
+            item.setToolTip("")
+        self.highlighted_ports = []
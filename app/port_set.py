@@ -0,0 +1,188 @@
+import heapq
+from bisect import bisect_right
+from typing import Iterable, Iterator, List, Tuple
+
+Interval = Tuple[int, int]
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort intervals and merge the ones that overlap or touch."""
+    return merge_sorted_intervals(sorted(intervals))
+
+
+def merge_sorted_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Merge intervals already sorted by start in a single pass."""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(intervals: List[Interval], excluded: List[Interval]) -> List[Interval]:
+    """Remove the excluded intervals from merged, sorted intervals."""
+    result = []
+    i = 0
+    for start, end in intervals:
+        while i < len(excluded) and excluded[i][1] < start:
+            i += 1
+        j = i
+        while j < len(excluded) and excluded[j][0] <= end:
+            if excluded[j][0] > start:
+                result.append((start, excluded[j][0] - 1))
+            start = max(start, excluded[j][1] + 1)
+            j += 1
+        if start <= end:
+            result.append((start, end))
+    return result
+
+
+def count_ports(intervals: Iterable[Interval]) -> int:
+    """Count the ports covered by merged intervals."""
+    return sum(end - start + 1 for start, end in intervals)
+
+
+class PortSet:
+    """A set of ports stored as merged, sorted, inclusive intervals.
+
+    A full 1-65535 selection is a single interval, and iteration yields ports lazily so
+    the scanner can consume a large selection as a stream.
+    """
+
+    __slots__ = ('_intervals', '_starts', '_size')
+
+    def __init__(self, intervals: Iterable[Interval] = ()) -> None:
+        """Build a set from any intervals, merging overlapping and adjacent ones."""
+        self._set_intervals(merge_intervals(intervals))
+
+
+    @classmethod
+    def from_ports(cls, ports: Iterable[int]) -> 'PortSet':
+        """Build a set from individual port numbers."""
+        return cls((port, port) for port in ports)
+
+
+    @property
+    def intervals(self) -> List[Interval]:
+        """Return a copy of the merged intervals."""
+        return list(self._intervals)
+
+
+    def union(self, other: 'PortSet') -> 'PortSet':
+        """Return the ports in either set."""
+        result = PortSet()
+        result._set_intervals(merge_sorted_intervals(heapq.merge(self._intervals, other._intervals)))
+        return result
+
+
+    def difference(self, other: 'PortSet') -> 'PortSet':
+        """Return the ports in this set but not in other."""
+        result = PortSet()
+        result._set_intervals(subtract_intervals(self._intervals, other._intervals))
+        return result
+
+
+    def intersection(self, other: 'PortSet') -> 'PortSet':
+        """Return the ports in both sets."""
+        return self.difference(self.difference(other))
+
+
+    def split(self, parts: int) -> List['PortSet']:
+        """Cut the set into at most parts sets of nearly equal size, each one a contiguous slice of the ports."""
+        chunk_size = -(-self._size // max(parts, 1))
+        chunks = []
+        current: List[Interval] = []
+        room = chunk_size
+
+        for start, end in self._intervals:
+            while start <= end:
+                taken = min(end - start + 1, room)
+                current.append((start, start + taken - 1))
+                start += taken
+                room -= taken
+                if room == 0:
+                    chunks.append(PortSet(current))
+                    current = []
+                    room = chunk_size
+
+        if current:
+            chunks.append(PortSet(current))
+        return chunks
+
+
+    def update(self, other: 'PortSet') -> None:
+        """Add every port of other to this set."""
+        self._set_intervals(self.union(other)._intervals)
+
+
+    def add(self, port: int) -> None:
+        """Add a single port."""
+        if port not in self:
+            self.update(PortSet([(port, port)]))
+
+
+    def discard(self, port: int) -> None:
+        """Remove a single port if present."""
+        if port in self:
+            self._set_intervals(subtract_intervals(self._intervals, [(port, port)]))
+
+
+    def clear(self) -> None:
+        """Remove every port."""
+        self._set_intervals([])
+
+
+    def __contains__(self, port: object) -> bool:
+        """Check membership with a binary search over interval starts."""
+        if not isinstance(port, int):
+            return False
+        i = bisect_right(self._starts, port) - 1
+        return i >= 0 and port <= self._intervals[i][1]
+
+
+    def __iter__(self) -> Iterator[int]:
+        """Yield ports in ascending order without materializing them."""
+        for start, end in self._intervals:
+            yield from range(start, end + 1)
+
+
+    def __len__(self) -> int:
+        return self._size
+
+
+    def __bool__(self) -> bool:
+        return bool(self._intervals)
+
+
+    def __or__(self, other: 'PortSet') -> 'PortSet':
+        return self.union(other)
+
+
+    def __and__(self, other: 'PortSet') -> 'PortSet':
+        return self.intersection(other)
+
+
+    def __sub__(self, other: 'PortSet') -> 'PortSet':
+        return self.difference(other)
+
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, PortSet) and self._intervals == other._intervals
+
+
+    def __str__(self) -> str:
+        return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in self._intervals)
+
+
+    def __repr__(self) -> str:
+        return f"PortSet('{self}')"
+
+
+    def _set_intervals(self, intervals: List[Interval]) -> None:
+        """Replace the intervals, which must already be merged and sorted."""
+        self._intervals = intervals
+        self._starts = [start for start, _ in intervals]
+        self._size = count_ports(intervals)
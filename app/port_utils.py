@@ -1,159 +1,491 @@
+import errno
 import socket
-import requests
+import selectors
+import hashlib
+import json
+import sys
 import threading
-import random
+import time
 import os
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from app.network_utils import ADDRESS_FAMILIES, DUAL_STACK_HOST, get_host_families, get_local_ips
+from app.port_set import PortSet
+from app.result_store import ResultStore
+from app.api_endpoint import ApiEndpoint
+from app.transport import ApiTransport, TransportConnectionError, create_transport
+from app.tracer import is_tracing, trace_async_span, trace_instant, trace_span
+from app.probe_backends import ProbeBackend, ProbeRunner, create_probe_backend
 
 
-PortsList = Dict[str, List[int]]
-PortsStatus = Dict[str, Dict[str, List[int]]]
+PortsList = Dict[str, PortSet]
+
+LISTENER_TIMEOUT = 2
+STOP_POLL_INTERVAL = 0.05
 
 load_dotenv()
 
 api_ip = os.getenv("API_IP")
 api_path = os.getenv("API_PATH")
+api_ip6 = os.getenv("API_IP6")
+reuse_port = os.getenv("REUSE_PORT", "0") == "1"
+scan_concurrency = int(os.getenv("SCAN_CONCURRENCY", "128"))
+history_file = os.getenv("SCAN_HISTORY_FILE")
+max_table_ports = int(os.getenv("MAX_TABLE_PORTS", "4096"))
+local_conflict_mode = os.getenv("LOCAL_CONFLICTS", "skip").lower()
+api_dns_ttl = float(os.getenv("API_DNS_TTL", "300"))
+firewall_prompt_enabled = os.getenv("FIREWALL_PROMPT", "1") == "1"
+firewall_state_file = os.getenv("FIREWALL_STATE_FILE", os.path.join(os.path.expanduser("~"), ".portknocker", "firewall_warmup.json"))
+http_transport = os.getenv("HTTP_TRANSPORT", "requests").lower()
+http2_connections = int(os.getenv("HTTP2_CONNECTIONS", "1"))
+probe_backend = os.getenv("PROBE_BACKEND", "api").lower()
+reflector_address = os.getenv("REFLECTOR_ADDRESS")
+agent_token = os.getenv("AGENT_TOKEN")
+agent_max_ports = int(os.getenv("AGENT_MAX_PORTS", "4096"))
+
+port_logger = logging.getLogger('ports')
+
+_api_transport: Optional[ApiTransport] = None
+_probe_runner: Optional[ProbeRunner] = None
+
+_api_endpoints: Dict[str, Optional[ApiEndpoint]] = {}
+_api_endpoints_lock = threading.Lock()
+_probe_runner_lock = threading.Lock()
+
+
+def apply_reuse_options(sock: socket.socket, protocol: str) -> None:
+    """Let a listener rebind a port still held in TIME_WAIT by a previous run."""
+    if hasattr(socket, 'SO_EXCLUSIVEADDRUSE'):
+        # On Windows SO_REUSEADDR allows port hijacking and TIME_WAIT never blocks bind().
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+    elif protocol == 'tcp':
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    if reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+
+def create_listening_sockets(protocol: str, host: str, port: int) -> List[socket.socket]:
+    """Create and bind the sockets needed to listen on host:port, one dual-stack socket when the OS supports it."""
+    sock_type = socket.SOCK_STREAM if protocol == 'tcp' else socket.SOCK_DGRAM
+    dual_stack = host == DUAL_STACK_HOST and socket.has_dualstack_ipv6()
+
+    if host == DUAL_STACK_HOST and not dual_stack:
+        addresses = [(socket.AF_INET, '0.0.0.0'), (socket.AF_INET6, '::')]
+    else:
+        addresses = [(socket.AF_INET6 if ':' in host else socket.AF_INET, host)]
+
+    sockets = []
+    try:
+        for family, address in addresses:
+            sock = socket.socket(family, sock_type)
+            sockets.append(sock)
+            apply_reuse_options(sock, protocol)
+            if family == socket.AF_INET6:
+                sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0 if dual_stack else 1)
+            sock.bind((address, port))
+            if protocol == 'tcp':
+                sock.listen(len(get_host_families(host)))
+    except Exception:
+        for sock in sockets:
+            sock.close()
+        raise
+
+    return sockets
+
+
+def serve_probes(protocol: str, sockets: List[socket.socket], expected: int, timeout: float, stop: Optional[threading.Event] = None) -> int:
+    """Answer up to `expected` probes on the given sockets, or until `stop` is set, and return how many were received."""
+    received = 0
+    deadline = time.monotonic() + timeout
+
+    with selectors.DefaultSelector() as selector:
+        for sock in sockets:
+            selector.register(sock, selectors.EVENT_READ)
+
+        while received < expected and not is_stopped(stop):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if stop is not None:
+                remaining = min(remaining, STOP_POLL_INTERVAL)
+
+            for key, _ in selector.select(remaining):
+                answer_probe(protocol, key.fileobj)
+                received += 1
+
+    return received
+
+
+def is_out_of_descriptors(error: BaseException) -> bool:
+    """Check whether an error, or one it was raised from, means the process ran out of file descriptors."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, OSError) and error.errno in (errno.EMFILE, errno.ENFILE):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def is_stopped(stop: Optional[threading.Event]) -> bool:
+    """Check whether the caller asked a listener to stop before its timeout."""
+    return stop is not None and stop.is_set()
+
+
+def answer_probe(protocol: str, sock: socket.socket) -> None:
+    """Accept a pending TCP connection or reply to a pending UDP message on a readable socket."""
+    if protocol == 'tcp':
+        conn, addr = sock.accept()
+        port_logger.info("Connection accepted from %s", addr)
+        conn.close()
+    else:
+        data, addr = sock.recvfrom(1024)
+        port_logger.info("Received data from %s", addr)
+        sock.sendto(b"PONG", addr)
 
+    if is_tracing():
+        port = sock.getsockname()[1]
+        trace_instant(f"probe {protocol}/{port}", protocol, 'probe', port=port, peer=str(addr[0]))
 
-def start_tcp_server(host: str, port: int, timeout: float) -> None:
-    """Start a TCP server and accept one connection."""
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-            logging.info(f"Starting TCP server on {host}:{port}")
-            server_socket.bind((host, port))
-            server_socket.listen(1)
-            server_socket.settimeout(timeout)
-            try:
-                conn, addr = server_socket.accept()
-                logging.info(f"Connection accepted from {addr}")
-                conn.close()
-            except socket.timeout:
-                logging.warning(f"TCP server on {host}:{port} timed out after {timeout} seconds")
+
+def start_tcp_server(host: str, port: int, timeout: float, stop: Optional[threading.Event] = None, ready: Optional[threading.Event] = None) -> bool:
+    """Start a TCP server and accept one connection per address family, returning False if it could not bind."""
+    expected = len(get_host_families(host))
+    port_logger.info("Starting TCP server on %s:%s", host, port)
+    try:
+        sockets = create_listening_sockets('tcp', host, port)
+    except OSError as e:
+        port_logger.error("Could not bind TCP server on %s:%s: %s", host, port, e)
+        return False
+    finally:
+        if ready is not None:
+            ready.set()
+
+    try:
+        if serve_probes('tcp', sockets, expected, timeout, stop) < expected and not is_stopped(stop):
+            port_logger.warning("TCP server on %s:%s timed out after %s seconds", host, port, timeout)
     except socket.error as e:
-        logging.error(f"Socket error in TCP server on {host}:{port}: {e}")
+        port_logger.error("Socket error in TCP server on %s:%s: %s", host, port, e)
     except Exception as e:
-        logging.critical(f"Unexpected error in TCP server on {host}:{port}: {e}")
-
-
-def start_udp_server(host: str, port: int, timeout: float) -> None:
-    """Start a UDP server and listen for one message."""
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
-            logging.info(f"Starting UDP server on {host}:{port}")
-            udp_socket.bind((host, port))
-            udp_socket.settimeout(timeout)
-            try:
-                data, addr = udp_socket.recvfrom(1024)
-                logging.info(f"Received data from {addr}")
-                udp_socket.sendto(b"PONG", addr)
-            except socket.timeout:
-                logging.warning(f"UDP server on {host}:{port} timed out after {timeout} seconds")
+        port_logger.critical("Unexpected error in TCP server on %s:%s: %s", host, port, e)
+    finally:
+        for sock in sockets:
+            sock.close()
+
+    return True
+
+
+def start_udp_server(host: str, port: int, timeout: float, stop: Optional[threading.Event] = None, ready: Optional[threading.Event] = None) -> bool:
+    """Start a UDP server and listen for one message per address family, returning False if it could not bind."""
+    expected = len(get_host_families(host))
+    port_logger.info("Starting UDP server on %s:%s", host, port)
+    try:
+        sockets = create_listening_sockets('udp', host, port)
+    except OSError as e:
+        port_logger.error("Could not bind UDP server on %s:%s: %s", host, port, e)
+        return False
+    finally:
+        if ready is not None:
+            ready.set()
+
+    try:
+        if serve_probes('udp', sockets, expected, timeout, stop) < expected and not is_stopped(stop):
+            port_logger.warning("UDP server on %s:%s timed out after %s seconds", host, port, timeout)
     except socket.error as e:
-        logging.error(f"Socket error in UDP server on {host}:{port}: {e}")
+        port_logger.error("Socket error in UDP server on %s:%s: %s", host, port, e)
     except Exception as e:
-        logging.critical(f"Unexpected error in UDP server on {host}:{port}: {e}")
+        port_logger.critical("Unexpected error in UDP server on %s:%s: %s", host, port, e)
+    finally:
+        for sock in sockets:
+            sock.close()
+
+    return True
 
 
-def start_server(protocol: str, host: str, port: int, timeout: float = 2):
-    """Start a server based on the specified protocol (TCP or UDP)."""
+def start_server(protocol: str, host: str, port: int, timeout: float = LISTENER_TIMEOUT, stop: Optional[threading.Event] = None,
+                 ready: Optional[threading.Event] = None) -> bool:
+    """Start a server based on the specified protocol (TCP or UDP), returning False if it could not bind.
+
+    `ready` is set once the sockets are bound, or failed to bind. Setting `stop` closes the listener
+    early, once the verdicts no longer need it.
+    """
     try:
         if protocol == 'tcp':
-            start_tcp_server(host, port, timeout)
+            return start_tcp_server(host, port, timeout, stop, ready)
         elif protocol == 'udp':
-            start_udp_server(host, port, timeout)
+            return start_udp_server(host, port, timeout, stop, ready)
         else:
-            logging.error(f"Unknown protocol: {protocol}")
+            port_logger.error("Unknown protocol: %s", protocol)
     except Exception as e:
-        logging.critical(f"Error in starting {protocol.upper()} server on {host}:{port}: {e}")
+        port_logger.critical("Error in starting %s server on %s:%s: %s", protocol.upper(), host, port, e)
+    return False
 
 
-def handle_port_status(protocol: str, port: int, ports_status: PortsStatus) -> None:
-    """Check and update the status of a given port for the specified protocol."""
+def handle_port_status(protocol: str, port: int, results: ResultStore, family: str = 'ipv4', host: str = '0.0.0.0') -> Optional[str]:
+    """Check the status of a port listened on at host over an address family, store it with its latency and return it."""
     try:
-        logging.info(f"Checking port {port} for protocol {protocol.upper()}")
-        port_open = is_port_open(protocol, port)
+        port_logger.info("Checking port %s for protocol %s over %s", port, protocol.upper(), family.upper())
+        result = get_probe_runner().check(protocol, port, host, family)
+        status = result.status
+        results.set_status(family, protocol, port, status, result.latency)
+        port_logger.debug("Probe timings for port %s (%s): %s", port, protocol.upper(), result.timings)
 
-        if port_open:
-            logging.info(f"Port {port} ({protocol.upper()}) is open")
-            ports_status['open'][protocol].append(port)
+        if status == 'open':
+            port_logger.info("Port %s (%s) is open", port, protocol.upper(), extra={'outcome': 'open', 'port_key': (protocol, port, family)})
         else:
-            logging.info(f"Port {port} ({protocol.upper()}) is closed")
-            ports_status['closed'][protocol].append(port)
+            port_logger.info("Port %s (%s) is closed", port, protocol.upper(), extra={'outcome': 'closed', 'port_key': (protocol, port, family)})
+        return status
+    except Exception as e:
+        port_logger.error("Error handling port status for %s on port %s: %s", protocol.upper(), port, e)
+    return None
+
+
+def get_api_endpoint(family: str = 'ipv4') -> Optional[ApiEndpoint]:
+    """Return the cached API endpoint for the given address family, None if no address is configured."""
+    with _api_endpoints_lock:
+        if family not in _api_endpoints:
+            host = api_ip6 if family == 'ipv6' else api_ip
+            _api_endpoints[family] = ApiEndpoint(host, family, api_dns_ttl) if host else None
+        return _api_endpoints[family]
+
+
+def get_probe_runner() -> ProbeRunner:
+    """Return the shared probe runner, creating the configured backend on first use.
+
+    Every port in flight sends one request per address family, so the backend gets enough
+    workers for all of them: a request left waiting would let its listener time out.
+    """
+    global _probe_runner
+    with _probe_runner_lock:
+        if _probe_runner is None:
+            _probe_runner = ProbeRunner(create_configured_probe_backend(scan_concurrency * len(ADDRESS_FAMILIES)))
+            logging.info("Checking ports with the %s probe backend.", _probe_runner.backend.name)
+        return _probe_runner
+
+
+def create_configured_probe_backend(api_workers: int) -> ProbeBackend:
+    """Create the configured probe backend, awaiting API requests directly when the transport is asynchronous."""
+    api_check_async = None if get_api_transport().blocking else is_port_open_async
+    return create_probe_backend(probe_backend, is_port_open, api_workers, reflector_address, api_check_async)
+
+
+def get_api_transport() -> ApiTransport:
+    """Return the shared HTTP transport, creating the configured one on first use."""
+    global _api_transport
+    with _api_endpoints_lock:
+        if _api_transport is None:
+            _api_transport = create_transport(http_transport, scan_concurrency * len(ADDRESS_FAMILIES), http2_connections)
+        return _api_transport
+
+
+def find_api_endpoint(protocol: str, port: int, family: str = 'ipv4') -> Optional[ApiEndpoint]:
+    """Return the API endpoint for the given address family, logging that the port cannot be checked if none is configured."""
+    endpoint = get_api_endpoint(family)
+    if endpoint is None:
+        port_logger.error("No API address configured for %s, cannot check port %s (%s)", family.upper(), port, protocol.upper())
+    return endpoint
+
+
+def build_api_request(protocol: str, port: int, family: str = 'ipv4') -> Optional[Tuple[ApiEndpoint, str]]:
+    """Return the API endpoint and verdict URL for a port over the given address family, None if it cannot be reached."""
+    endpoint = find_api_endpoint(protocol, port, family)
+    if endpoint is None:
+        return None
+
+    try:
+        return endpoint, f"http://{endpoint.address()}/{api_path}/{protocol}/{port}"
+    except OSError as e:
+        port_logger.error("Could not resolve API host %s when checking port %s (%s): %s", endpoint.hostname, port, protocol.upper(), e)
+        return None
+
+
+async def build_api_request_async(protocol: str, port: int, family: str = 'ipv4') -> Optional[Tuple[ApiEndpoint, str]]:
+    """Return the API endpoint and verdict URL like build_api_request(), resolving the host without blocking the event loop."""
+    endpoint = find_api_endpoint(protocol, port, family)
+    if endpoint is None:
+        return None
+
+    try:
+        return endpoint, f"http://{await endpoint.address_async()}/{api_path}/{protocol}/{port}"
+    except OSError as e:
+        port_logger.error("Could not resolve API host %s when checking port %s (%s): %s", endpoint.hostname, port, protocol.upper(), e)
+        return None
+
+
+def read_api_status(status_code: int, protocol: str, port: int) -> bool:
+    """Turn the status code of a verdict response into whether the port is open."""
+    if status_code == 200:
+        port_logger.info("Port %s (%s) is open according to API response", port, protocol.upper())
+        return True
+    elif status_code == 400:
+        port_logger.warning("Bad request for port %s (%s)", port, protocol.upper())
+    elif status_code == 444:
+        port_logger.warning("Port %s (%s) is closed or unreachable", port, protocol.upper())
+    elif status_code == 408:
+        port_logger.warning("Request timeout for port %s (%s)", port, protocol.upper())
+    elif status_code == 500:
+        port_logger.error("Server error (500) for port %s (%s)", port, protocol.upper())
+    else:
+        port_logger.warning("Unexpected status code %s for port %s (%s)", status_code, port, protocol.upper())
+    return False
+
+
+def raise_if_out_of_descriptors(error: Exception) -> None:
+    """Re-raise a request error caused by running out of file descriptors, so the port gets no verdict instead of 'closed'."""
+    if is_out_of_descriptors(error):
+        raise error
+
+
+def is_port_open(protocol: str, port: int, family: str = 'ipv4') -> bool:
+    """Check if a specific port is open using the API, reached over the given address family."""
+    request = build_api_request(protocol, port, family)
+    if request is None:
+        return False
+    endpoint, api_url = request
+
+    try:
+        port_logger.info("Sending request to %s", api_url)
+        with trace_span(f"request {protocol}/{port}", protocol, 'request', port=port, family=family):
+            status_code = get_api_transport().get(api_url, { 'Host': endpoint.host_header })
+        return read_api_status(status_code, protocol, port)
+
+    except TransportConnectionError as e:
+        raise_if_out_of_descriptors(e)
+        # The cached address may be stale: resolve the hostname again on the next request.
+        endpoint.invalidate()
+        port_logger.error("Connection error when checking port %s (%s): %s", port, protocol.upper(), e)
+        return False
     except Exception as e:
-        logging.error(f"Error handling port status for {protocol.upper()} on port {port}: {e}")
+        raise_if_out_of_descriptors(e)
+        port_logger.critical("Unexpected error when checking port %s (%s): %s", port, protocol.upper(), e)
+        return False
+
+
+async def is_port_open_async(protocol: str, port: int, family: str = 'ipv4') -> bool:
+    """Check if a specific port is open like is_port_open(), awaiting the request on an asynchronous transport.
 
+    The requests of every port share the probe runner's thread, so each one is traced as an async span.
+    """
+    request = await build_api_request_async(protocol, port, family)
+    if request is None:
+        return False
+    endpoint, api_url = request
 
-def is_port_open(protocol: str, port: int) -> bool:
-    """Check if a specific port is open using the API."""
-    api_url = f"http://{api_ip}/{api_path}/{protocol}/{port}"
-    
     try:
-        logging.info(f"Sending request to {api_url}")
-        res = requests.get(api_url)
+        port_logger.info("Sending request to %s", api_url)
+        with trace_async_span(f"request {protocol}/{port}", protocol, 'request', port=port, family=family):
+            status_code = await get_api_transport().get_async(api_url, { 'Host': endpoint.host_header })
+        return read_api_status(status_code, protocol, port)
 
-        if res.status_code == 200:
-            logging.info(f"Port {port} ({protocol.upper()}) is open according to API response")
-            return True
-        elif res.status_code == 400:
-            logging.warning(f"Bad request for port {port} ({protocol.upper()})")
-            return False
-        elif res.status_code == 444:
-            logging.warning(f"Port {port} ({protocol.upper()}) is closed or unreachable")
-            return False
-        elif res.status_code == 408:
-            logging.warning(f"Request timeout for port {port} ({protocol.upper()})")
-            return False
-        elif res.status_code == 500:
-            logging.error(f"Server error (500) for port {port} ({protocol.upper()})")
-            return False
-        else:
-            logging.warning(f"Unexpected status code {res.status_code} for port {port} ({protocol.upper()})")
-            return False
-        
-    except requests.ConnectionError as e:
-        logging.error(f"Connection error when checking port {port} ({protocol.upper()}): {e}")
+    except TransportConnectionError as e:
+        raise_if_out_of_descriptors(e)
+        endpoint.invalidate()
+        port_logger.error("Connection error when checking port %s (%s): %s", port, protocol.upper(), e)
         return False
     except Exception as e:
-        logging.critical(f"Unexpected error when checking port {port} ({protocol.upper()}): {e}")
+        raise_if_out_of_descriptors(e)
+        port_logger.critical("Unexpected error when checking port %s (%s): %s", port, protocol.upper(), e)
         return False
 
-    
-def trigger_firewall_prompt() -> None:
-    """Trigger a prompt to open firewall ports for TCP and UDP servers."""
+
+def trigger_firewall_prompt(force: bool = False) -> None:
+    """Trigger a prompt to open firewall ports for TCP and UDP servers, unless it already succeeded for this binary and interfaces."""
+    warmup_key = get_firewall_warmup_key()
+    if not force and is_firewall_warmed_up(warmup_key):
+        logging.info("Firewall warm-up already done for this binary and interfaces, skipping it.")
+        return
+
     try:
-        port = get_random_port()
-        logging.info(f"Randomly selected port: {port}")
+        sockets = { protocol: bind_ephemeral_socket(protocol) for protocol in ('tcp', 'udp') }
+    except OSError as e:
+        logging.warning("Error triggering firewall prompt: %s", e)
+        return
 
-        tcp_server_thread = threading.Thread(target=start_server, args=('tcp', '0.0.0.0', port))
-        udp_server_thread = threading.Thread(target=start_server, args=('udp', '0.0.0.0', port))
+    ports = {}
+    for protocol, sock in sockets.items():
+        ports[protocol] = sock.getsockname()[1]
+        logging.info("Kernel assigned %s port %s for the firewall prompt.", protocol.upper(), ports[protocol])
+        threading.Thread(target=serve_bound_socket, args=(protocol, sock, LISTENER_TIMEOUT)).start()
 
-        tcp_thread = threading.Thread(target=is_port_open, args=('tcp', port))
-        udp_thread = threading.Thread(target=is_port_open, args=('udp', port))
+    threading.Thread(target=confirm_firewall_warmup, args=(ports, warmup_key)).start()
 
-        tcp_server_thread.start()
-        udp_server_thread.start()
 
-        tcp_thread.start()
-        udp_thread.start()
-    except Exception as e:
-        logging.warning(f"Error triggering firewall prompt: {e}")
-
-
-def get_random_port(max_attempts: int = 10) -> Optional[int]:
-    """Get a random available port within a specified number of attempts."""
-    attempts = 0
-    while attempts < max_attempts:
-        port = random.randint(49152, 65535)
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            result = s.connect_ex(('0.0.0.0', port))
-            if result != 0:
-                logging.info(f"Port {port} is available.")
-                return port
-            else:
-                logging.warning(f"Port {port} is in use, trying another ({max_attempts - attempts} attempts left).")
-        attempts += 1
-    
-    logging.error("Exceeded maximum attempts to find an available port.")
-    raise RuntimeError("No available ports found after maximum attempts.")
+def confirm_firewall_warmup(ports: Dict[str, int], warmup_key: str) -> None:
+    """Ask the API about the warm-up ports and remember the warm-up once both are reachable."""
+    verdicts = {}
+
+    def check(protocol: str) -> None:
+        verdicts[protocol] = is_port_open(protocol, ports[protocol])
+
+    threads = [threading.Thread(target=check, args=(protocol,)) for protocol in ports]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if all(verdicts.values()):
+        record_firewall_warmup(warmup_key)
+
+
+def get_firewall_warmup_key() -> str:
+    """Identify this binary and interface set, so a new build or network triggers the warm-up again."""
+    try:
+        stat = os.stat(sys.executable)
+        binary = f"{sys.executable}:{stat.st_size}:{int(stat.st_mtime)}"
+    except OSError:
+        binary = sys.executable
+    interfaces = ",".join(sorted(get_local_ips()))
+    return hashlib.sha256(f"{binary}|{interfaces}".encode()).hexdigest()
+
+
+def is_firewall_warmed_up(warmup_key: str) -> bool:
+    """Check whether the warm-up already succeeded for the given key."""
+    try:
+        with open(firewall_state_file, 'r', encoding='utf-8') as f:
+            return warmup_key in json.load(f).get('warmed_up', [])
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+def record_firewall_warmup(warmup_key: str) -> None:
+    """Remember that the warm-up succeeded for the given key."""
+    try:
+        with open(firewall_state_file, 'r', encoding='utf-8') as f:
+            keys = json.load(f).get('warmed_up', [])
+    except (OSError, ValueError, AttributeError):
+        keys = []
+
+    try:
+        os.makedirs(os.path.dirname(firewall_state_file), exist_ok=True)
+        with open(firewall_state_file, 'w', encoding='utf-8') as f:
+            json.dump({ 'warmed_up': (keys + [warmup_key])[-16:] }, f)
+        logging.info("Firewall warm-up succeeded, later launches will skip it.")
+    except OSError as e:
+        logging.warning("Could not record the firewall warm-up in %s: %s", firewall_state_file, e)
+
+
+def bind_ephemeral_socket(protocol: str, host: str = '0.0.0.0') -> socket.socket:
+    """Bind a socket to port 0 so the kernel atomically assigns a free ephemeral port."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM if protocol == 'tcp' else socket.SOCK_DGRAM)
+    try:
+        sock.bind((host, 0))
+        if protocol == 'tcp':
+            sock.listen(1)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def serve_bound_socket(protocol: str, sock: socket.socket, timeout: float) -> None:
+    """Answer one probe on an already bound socket, then close it."""
+    host, port = sock.getsockname()[:2]
+    try:
+        if serve_probes(protocol, [sock], 1, timeout) < 1:
+            port_logger.warning("%s server on %s:%s timed out after %s seconds", protocol.upper(), host, port, timeout)
+    except OSError as e:
+        port_logger.error("Socket error in %s server on %s:%s: %s", protocol.upper(), host, port, e)
+    finally:
+        sock.close()
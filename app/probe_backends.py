@@ -0,0 +1,244 @@
+import asyncio
+import socket
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+PROBE_BACKENDS = ('api', 'reflector', 'loopback')
+KNOCK_TIMEOUT = 1.0
+KNOCK_RETRY_INTERVAL = 0.01
+REFLECTOR_PORT = 9770
+
+ApiCheck = Callable[[str, int, str], bool]
+AsyncApiCheck = Callable[[str, int, str], Awaitable[bool]]
+
+
+class ProbeResult:
+    """Verdict of one probe, with the time spent in each of its steps in seconds."""
+
+    __slots__ = ('status', 'timings')
+
+    def __init__(self, status: str, timings: Dict[str, float]) -> None:
+        """Initialize the result with an 'open' or 'closed' status and its timings."""
+        self.status = status
+        self.timings = timings
+
+
+    @property
+    def latency(self) -> float:
+        """Return the total time the probe took."""
+        return sum(self.timings.values())
+
+
+class ProbeBackend:
+    """Decide whether a port listened on locally can be reached. Probes are coroutines run on one event loop."""
+
+    name = ''
+
+    async def probe(self, protocol: str, port: int, host: str, family: str = 'ipv4') -> ProbeResult:
+        """Probe a port the local listener is bound to on host, over an address family."""
+        raise NotImplementedError
+
+
+    def close(self) -> None:
+        """Release the resources held by the backend."""
+
+
+async def knock(protocol: str, address: str, port: int, timeout: float = KNOCK_TIMEOUT) -> bool:
+    """Connect to a TCP port, or send a UDP message and wait for the reply, returning whether it answered in time.
+
+    Refused attempts are retried until the timeout, since the listener may still be binding.
+    """
+    loop = asyncio.get_running_loop()
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    deadline = loop.time() + timeout
+
+    while True:
+        remaining = deadline - loop.time()
+        try:
+            if protocol == 'tcp':
+                _, writer = await asyncio.wait_for(asyncio.open_connection(address, port, family=family), remaining)
+                writer.close()
+                return True
+
+            with socket.socket(family, socket.SOCK_DGRAM) as sock:
+                sock.setblocking(False)
+                await loop.sock_connect(sock, (address, port))
+                await loop.sock_sendall(sock, b"PING")
+                await asyncio.wait_for(loop.sock_recv(sock, 1024), min(remaining, KNOCK_RETRY_INTERVAL * 10))
+                return True
+        except (OSError, asyncio.TimeoutError):
+            if deadline - loop.time() < KNOCK_RETRY_INTERVAL:
+                return False
+            await asyncio.sleep(KNOCK_RETRY_INTERVAL)
+
+
+class HttpApiBackend(ProbeBackend):
+    """Ask the external HTTP API: awaited directly on asynchronous transports, on a dedicated thread pool otherwise."""
+
+    name = 'api'
+
+    def __init__(self, api_check: ApiCheck, workers: int, api_check_async: Optional[AsyncApiCheck] = None) -> None:
+        """Initialize the backend with the functions asking the API and the number of concurrent blocking requests."""
+        self.api_check = api_check
+        self.api_check_async = api_check_async
+        self._executor = None
+        if api_check_async is None:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-probe')
+
+
+    async def probe(self, protocol: str, port: int, host: str, family: str = 'ipv4') -> ProbeResult:
+        """Send the verdict request and time it."""
+        start = time.perf_counter()
+        if self.api_check_async is not None:
+            port_open = await self.api_check_async(protocol, port, family)
+        else:
+            port_open = await asyncio.get_running_loop().run_in_executor(self._executor, self.api_check, protocol, port, family)
+        return ProbeResult('open' if port_open else 'closed', { 'request': time.perf_counter() - start })
+
+
+    def close(self) -> None:
+        """Stop the request threads, if any."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+class ReflectorBackend(ProbeBackend):
+    """Ask a reflector, started elsewhere with --reflector, to knock back on the port.
+
+    The protocol is one line each way: 'tcp 8080' is answered with 'open' or 'closed'.
+    """
+
+    name = 'reflector'
+
+    def __init__(self, address: str) -> None:
+        """Initialize the backend for a reflector at 'host[:port]'."""
+        parts = urlsplit(f"//{address}")
+        self.hostname = parts.hostname
+        self.port = parts.port or REFLECTOR_PORT
+
+
+    async def probe(self, protocol: str, port: int, host: str, family: str = 'ipv4') -> ProbeResult:
+        """Connect to the reflector over the family, ask for a knock and read its verdict."""
+        start = time.perf_counter()
+        address_family = socket.AF_INET6 if family == 'ipv6' else socket.AF_INET
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(self.hostname, self.port, family=address_family), KNOCK_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as e:
+            logging.error("Could not reach the reflector at %s:%s: %s", self.hostname, self.port, e)
+            return ProbeResult('closed', { 'connect': time.perf_counter() - start })
+
+        connected = time.perf_counter()
+        try:
+            writer.write(f"{protocol} {port}\n".encode())
+            reply = await asyncio.wait_for(reader.readline(), KNOCK_TIMEOUT * 2)
+        except (OSError, asyncio.TimeoutError) as e:
+            logging.error("Reflector at %s:%s did not answer for port %s (%s): %s", self.hostname, self.port, port, protocol.upper(), e)
+            reply = b""
+        finally:
+            writer.close()
+
+        status = 'open' if reply.strip() == b"open" else 'closed'
+        return ProbeResult(status, { 'connect': connected - start, 'knock': time.perf_counter() - connected })
+
+
+class LoopbackBackend(ProbeBackend):
+    """Knock on the port from this machine, to self-test the listeners without any external service."""
+
+    name = 'loopback'
+
+    async def probe(self, protocol: str, port: int, host: str, family: str = 'ipv4') -> ProbeResult:
+        """Knock on the bind address, or on the loopback address of the family for wildcard binds."""
+        if host in ('0.0.0.0', '::'):
+            address = '::1' if family == 'ipv6' else '127.0.0.1'
+        else:
+            address = host
+
+        start = time.perf_counter()
+        port_open = await knock(protocol, address, port)
+        return ProbeResult('open' if port_open else 'closed', { 'knock': time.perf_counter() - start })
+
+
+def create_probe_backend(name: str, api_check: ApiCheck, api_workers: int, reflector_address: Optional[str] = None,
+                         api_check_async: Optional[AsyncApiCheck] = None) -> ProbeBackend:
+    """Create the backend called name, falling back to the HTTP API if it is unknown or not configured.
+
+    The API backend awaits api_check_async when given, and runs api_check on api_workers threads otherwise.
+    """
+    if name == 'reflector':
+        if reflector_address:
+            return ReflectorBackend(reflector_address)
+        logging.warning("The reflector backend needs REFLECTOR_ADDRESS. Falling back to the API.")
+    elif name == 'loopback':
+        return LoopbackBackend()
+    elif name != 'api':
+        logging.warning("Unknown probe backend %s, use one of %s. Falling back to the API.", name, ", ".join(PROBE_BACKENDS))
+
+    return HttpApiBackend(api_check, api_workers, api_check_async)
+
+
+class ProbeRunner:
+    """Run a backend's probes on a private event loop thread, so blocking callers can wait for them."""
+
+    def __init__(self, backend: ProbeBackend) -> None:
+        """Start the event loop thread for the backend."""
+        self.backend = backend
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=f'{backend.name}-probes', daemon=True)
+        self._thread.start()
+
+
+    def check(self, protocol: str, port: int, host: str, family: str = 'ipv4') -> ProbeResult:
+        """Probe a port and wait for the result."""
+        return asyncio.run_coroutine_threadsafe(self.backend.probe(protocol, port, host, family), self._loop).result()
+
+
+    def close(self) -> None:
+        """Close the backend and stop the event loop thread."""
+        self.backend.close()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+async def handle_reflector_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Knock back on the peer for every 'protocol port' line it sends."""
+    peer = writer.get_extra_info('peername')[0]
+    try:
+        while line := await reader.readline():
+            try:
+                protocol, port = line.decode().split()
+                port = int(port)
+                if protocol not in ('tcp', 'udp') or not 0 < port < 65536:
+                    raise ValueError(line)
+            except ValueError:
+                writer.write(b"error\n")
+                break
+
+            port_open = await knock(protocol, peer, port)
+            logging.info("Reflected %s port %s for %s: %s", protocol.upper(), port, peer, "open" if port_open else "closed")
+            writer.write(b"open\n" if port_open else b"closed\n")
+            await writer.drain()
+    except OSError as e:
+        logging.warning("Reflector connection from %s failed: %s", peer, e)
+    finally:
+        writer.close()
+
+
+def run_reflector(address: str) -> None:
+    """Serve reflector requests on '[host:]port' until interrupted."""
+    parts = urlsplit(f"//{address}" if ':' in address else f"//:{address}")
+
+    async def serve() -> None:
+        server = await asyncio.start_server(handle_reflector_client, parts.hostname, parts.port or REFLECTOR_PORT)
+        logging.info("Reflector listening on %s.", ", ".join(str(sock.getsockname()) for sock in server.sockets))
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        logging.info("Reflector stopped.")
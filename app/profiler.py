@@ -0,0 +1,153 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import logging
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import ContextManager, Dict, Iterator, List, Optional, Tuple
+
+PHASES = ('validation', 'table population', 'engine start', 'verdict wait', 'result rendering')
+REPORT_LINES = 60
+
+# Before Python 3.12 a cProfile.Profile only sees the thread that enabled it.
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+
+class ScanProfiler:
+    """Collect cProfile statistics from every thread and the wall-clock time spent in each scan phase."""
+
+    def __init__(self, report_path: str) -> None:
+        """Initialize the profiler writing its report to report_path."""
+        self.report_path = report_path
+        self.phase_times: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.phase_calls: Dict[str, int] = dict.fromkeys(PHASES, 0)
+        self._profiles: List[Tuple[Optional[threading.Thread], cProfile.Profile]] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._main_profile = cProfile.Profile()
+        self._started_at = 0.0
+
+
+    def start(self) -> None:
+        """Profile the calling thread and, before Python 3.12, every thread started from now on."""
+        self._started_at = time.perf_counter()
+        self._local.profiled = True
+        if PER_THREAD_PROFILES:
+            threading.setprofile(self._profile_new_thread)
+        self._main_profile.enable()
+
+
+    def _profile_new_thread(self, frame, event, arg) -> None:
+        """Replace the bootstrap hook of a new thread with a profile of its own."""
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append((threading.current_thread(), profile))
+        self._local.profiled = True
+        profile.enable()
+
+
+    @contextmanager
+    def thread(self) -> Iterator[None]:
+        """Profile the calling thread for the duration of the block, for threads not started by the threading module."""
+        if not PER_THREAD_PROFILES or getattr(self._local, 'profiled', False):
+            yield
+            return
+
+        profile = cProfile.Profile()
+        self._local.profiled = True
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._local.profiled = False
+            with self._lock:
+                self._profiles.append((None, profile))
+
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Add the wall-clock time of the block to a phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+
+    def record(self, name: str, seconds: float) -> None:
+        """Add a measured duration to a phase."""
+        with self._lock:
+            self.phase_times[name] += seconds
+            self.phase_calls[name] += 1
+
+
+    def stop(self) -> None:
+        """Stop profiling and write the phase breakdown and merged statistics to the report files."""
+        self._main_profile.disable()
+        if PER_THREAD_PROFILES:
+            threading.setprofile(None)
+        elapsed = time.perf_counter() - self._started_at
+
+        with self._lock:
+            # Threads still running, such as the listener pool's, cannot be read safely.
+            profiles = [profile for thread, profile in self._profiles if thread is None or not thread.is_alive()]
+
+        stats_stream = io.StringIO()
+        stats = pstats.Stats(self._main_profile, *profiles, stream=stats_stream)
+        stats.sort_stats('cumulative').print_stats(REPORT_LINES)
+
+        try:
+            with open(self.report_path, 'w', encoding='utf-8') as f:
+                f.write(f"Port Knocker profile, {datetime.now().isoformat(timespec='seconds')}\n\n")
+                f.write(f"{'Phase':<20}{'Wall time (s)':>15}{'Calls':>10}\n")
+                for name in PHASES:
+                    f.write(f"{name:<20}{self.phase_times[name]:>15.4f}{self.phase_calls[name]:>10}\n")
+                f.write(f"{'total run':<20}{elapsed:>15.4f}\n\n")
+                f.write(f"cProfile statistics merged over {len(profiles) + 1} threads:\n")
+                f.write(stats_stream.getvalue())
+            stats.dump_stats(f"{self.report_path}.pstats")
+            logging.info("Profile written to %s and %s.pstats.", self.report_path, self.report_path)
+        except OSError as e:
+            logging.error("Could not write the profile to %s: %s", self.report_path, e)
+
+
+_profiler: Optional[ScanProfiler] = None
+
+
+def start_profiling(report_path: str) -> None:
+    """Start profiling the application, writing the report to report_path on stop_profiling()."""
+    global _profiler
+    _profiler = ScanProfiler(report_path)
+    _profiler.start()
+
+
+def stop_profiling() -> None:
+    """Stop profiling and write the report, if profiling was started."""
+    global _profiler
+    if _profiler is not None:
+        _profiler.stop()
+        _profiler = None
+
+
+def profile_phase(name: str) -> ContextManager[None]:
+    """Time the block as part of a scan phase when profiling, and do nothing otherwise."""
+    if _profiler is None:
+        return nullcontext()
+    return _profiler.phase(name)
+
+
+def profile_thread() -> ContextManager[None]:
+    """Profile the calling thread for the duration of the block when profiling, and do nothing otherwise."""
+    if _profiler is None:
+        return nullcontext()
+    return _profiler.thread()
+
+
+def record_phase(name: str, seconds: float) -> None:
+    """Add a duration measured elsewhere to a scan phase when profiling."""
+    if _profiler is not None:
+        _profiler.record(name, seconds)
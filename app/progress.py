@@ -0,0 +1,112 @@
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Iterator, Optional, Tuple
+
+RATE_WINDOW = 5.0
+PROGRESS_INTERVAL = 2.0
+
+
+def format_duration(seconds: float) -> str:
+    """Format a duration as 'm:ss', or 'h:mm:ss' past an hour."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}" if hours else f"{minutes}:{seconds:02}"
+
+
+class ProgressSnapshot:
+    """Progress of a scan at one instant."""
+
+    __slots__ = ('completed', 'total', 'in_flight', 'rate', 'eta', 'elapsed')
+
+    def __init__(self, completed: int, total: int, in_flight: Optional[int], rate: float, eta: Optional[float], elapsed: float) -> None:
+        """Initialize the snapshot. in_flight is None when the engine cannot tell, eta when the rate is zero."""
+        self.completed = completed
+        self.total = total
+        self.in_flight = in_flight
+        self.rate = rate
+        self.eta = eta
+        self.elapsed = elapsed
+
+
+    def __str__(self) -> str:
+        """Describe the progress in one line, such as '1200/5000 ports (24%), 310 ports/s, 200 in flight, ETA 0:12'."""
+        percent = 100 * self.completed // self.total if self.total else 100
+        parts = [f"{self.completed}/{self.total} ports ({percent}%)", f"{self.rate:.0f} ports/s"]
+        if self.in_flight is not None:
+            parts.append(f"{self.in_flight} in flight")
+        parts.append(f"ETA {format_duration(self.eta)}" if self.eta is not None else "ETA unknown")
+        return ", ".join(parts)
+
+
+class ScanProgress:
+    """Completed and in-flight port counts of a scan, with the throughput averaged over a sliding window.
+
+    A slow API shows as a low but steady rate, a stuck scan as a rate falling to zero while ports stay in flight.
+    """
+
+    def __init__(self, total: int, window: float = RATE_WINDOW) -> None:
+        """Initialize the progress of a scan of total ports, averaging the rate over window seconds."""
+        self.total = total
+        self.window = window
+        self.completed = 0
+        self.in_flight: Optional[int] = 0
+        self.started_at = time.perf_counter()
+        self._samples: Deque[Tuple[float, int]] = deque([(self.started_at, 0)])
+        self._lock = threading.Lock()
+
+
+    def port_started(self) -> None:
+        """Count a port the engine started checking."""
+        with self._lock:
+            self.in_flight += 1
+
+
+    def port_finished(self) -> None:
+        """Count a port the engine finished checking."""
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+
+    def set_completed(self, completed: int) -> None:
+        """Set the completed count directly, for engines that do not report ports one by one."""
+        with self._lock:
+            self.completed = completed
+            self.in_flight = None
+
+
+    def snapshot(self) -> ProgressSnapshot:
+        """Sample the completed count and return the current progress, rate and ETA."""
+        with self._lock:
+            now = time.perf_counter()
+            self._samples.append((now, self.completed))
+            # Keep one sample at least a window old, so the rate always spans a full window once there is one.
+            while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+                self._samples.popleft()
+
+            since, completed_then = self._samples[0]
+            rate = (self.completed - completed_then) / (now - since) if now > since else 0.0
+            remaining = self.total - self.completed
+            eta = remaining / rate if rate > 0 else (0.0 if remaining <= 0 else None)
+            return ProgressSnapshot(self.completed, self.total, self.in_flight, rate, eta, now - self.started_at)
+
+
+@contextmanager
+def logging_progress(progress: ScanProgress, interval: float = PROGRESS_INTERVAL) -> Iterator[None]:
+    """Log the progress of the scan every interval seconds while the block runs."""
+    stopped = threading.Event()
+
+    def report() -> None:
+        while not stopped.wait(interval):
+            logging.info("Progress: %s", progress.snapshot())
+
+    thread = threading.Thread(target=report, name='progress', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
@@ -0,0 +1,144 @@
+import itertools
+import re
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.port_set import PortSet
+
+PORT_SLOTS = 65536
+PROTOCOLS = ('tcp', 'udp')
+STATUSES = ('pending', 'open', 'closed', 'bind_error', 'in_use')
+STATUS_CODES = { status: code for code, status in enumerate(STATUSES) }
+STATUS_RUNS = { status: re.compile(re.escape(bytes([code])) + b'+') for status, code in STATUS_CODES.items() }
+
+PortResult = Tuple[str, str, int, str]
+
+
+class ResultStore:
+    """Preallocated per-scan results: one status byte and one packed latency per family, protocol and port.
+
+    Writers never share a list: each port owns its slots, and completions go to a preallocated
+    log through an atomic counter, so readers can pick up new results incrementally with read_new().
+    A full two-family, two-protocol store takes about 2.3 MB.
+
+    Statuses and latencies can live in an external buffer, such as shared memory, so that
+    several processes fill one store. The completion log always stays private to a process.
+    """
+
+    def __init__(self, families: List[str], buffer: Optional[memoryview] = None) -> None:
+        """Allocate slots for every port of every protocol in the given address families, in buffer if given."""
+        self.families = list(families)
+        self._family_index = { family: i for i, family in enumerate(self.families) }
+        slots = len(self.families) * len(PROTOCOLS) * PORT_SLOTS
+
+        if buffer is None:
+            self._status = bytearray(slots)
+            self._latency_us = array('I', bytes(4 * slots))
+        else:
+            self._status = buffer[:slots]
+            self._latency_us = buffer[slots:5 * slots].cast('I')
+        self._completed = array('i', [-1]) * slots
+        self._sequence = itertools.count()
+
+
+    @staticmethod
+    def buffer_size(families: List[str]) -> int:
+        """Return the size in bytes of the external buffer a store for these families needs."""
+        return 5 * len(families) * len(PROTOCOLS) * PORT_SLOTS
+
+
+    def detach(self) -> 'ResultStore':
+        """Copy the statuses and latencies to a private store and publish every finished port in it."""
+        store = ResultStore(self.families)
+        store._status[:] = self._status
+        store._latency_us = array('I', bytes(self._latency_us))
+
+        for slot in range(len(store._status)):
+            if store._status[slot]:
+                store._completed[next(store._sequence)] = slot
+        return store
+
+
+    def release(self) -> None:
+        """Drop the views on an external buffer so it can be closed."""
+        if isinstance(self._status, memoryview):
+            self._status.release()
+            self._latency_us.release()
+
+
+    def _slot(self, family: str, protocol: str, port: int) -> int:
+        """Return the flat index of a (family, protocol, port) slot."""
+        return (self._family_index[family] * len(PROTOCOLS) + PROTOCOLS.index(protocol)) * PORT_SLOTS + port
+
+
+    def _unpack(self, slot: int) -> Tuple[str, str, int]:
+        """Turn a flat slot index back into (family, protocol, port)."""
+        group, port = divmod(slot, PORT_SLOTS)
+        family_index, protocol_index = divmod(group, len(PROTOCOLS))
+        return self.families[family_index], PROTOCOLS[protocol_index], port
+
+
+    def set_status(self, family: str, protocol: str, port: int, status: str, latency: Optional[float] = None) -> None:
+        """Store the status, and optionally the latency in seconds, of a port without publishing it."""
+        slot = self._slot(family, protocol, port)
+        self._status[slot] = STATUS_CODES[status]
+        if latency is not None:
+            self._latency_us[slot] = min(int(latency * 1_000_000), 0xFFFFFFFF)
+
+
+    def complete(self, family: str, protocol: str, port: int) -> None:
+        """Publish the final status of a port to incremental readers. Call once per port and family."""
+        self._completed[next(self._sequence)] = self._slot(family, protocol, port)
+
+
+    def status(self, family: str, protocol: str, port: int) -> str:
+        """Return the stored status of a port, 'pending' if it has none."""
+        return STATUSES[self._status[self._slot(family, protocol, port)]]
+
+
+    def latency(self, family: str, protocol: str, port: int) -> Optional[float]:
+        """Return the stored latency of a port in seconds, None if it has none."""
+        latency_us = self._latency_us[self._slot(family, protocol, port)]
+        return latency_us / 1_000_000 if latency_us else None
+
+
+    def read_new(self, cursor: int = 0) -> Tuple[int, List[PortResult]]:
+        """Return the results completed since cursor as (family, protocol, port, status), and the next cursor."""
+        results = []
+        while cursor < len(self._completed) and self._completed[cursor] != -1:
+            slot = self._completed[cursor]
+            family, protocol, port = self._unpack(slot)
+            results.append((family, protocol, port, STATUSES[self._status[slot]]))
+            cursor += 1
+        return cursor, results
+
+
+    def ports_with_status(self, family: str, protocol: str, status: str) -> Iterator[int]:
+        """Yield the ports of a family and protocol that ended with the given status."""
+        start = self._slot(family, protocol, 0)
+        block = bytes(self._status[start:start + PORT_SLOTS])
+        code = STATUS_CODES[status]
+        port = block.find(code)
+        while port != -1:
+            yield port
+            port = block.find(code, port + 1)
+
+
+    def port_set(self, family: str, protocol: str, status: str) -> PortSet:
+        """Return the ports of a family and protocol that ended with the given status, built from runs of equal bytes."""
+        start = self._slot(family, protocol, 0)
+        block = bytes(self._status[start:start + PORT_SLOTS])
+        return PortSet((run.start(), run.end() - 1) for run in STATUS_RUNS[status].finditer(block))
+
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Count the ports in every final status, per family."""
+        counts = {}
+        for family in self.families:
+            family_counts = { status: 0 for status in STATUSES[1:] }
+            for protocol in PROTOCOLS:
+                start = self._slot(family, protocol, 0)
+                block = bytes(self._status[start:start + PORT_SLOTS])
+                for status in family_counts:
+                    family_counts[status] += block.count(STATUS_CODES[status])
+            counts[family] = family_counts
+        return counts
@@ -0,0 +1,129 @@
+import csv
+import gzip
+import json
+import logging
+from typing import Dict, Iterable, Iterator, List
+from app.port_set import PortSet
+from app.result_store import PROTOCOLS, STATUSES, ResultStore
+from app.scan_plan import PortKey, ScanHistory
+from app.exporters import guess_export_format
+
+# One set of ports per final status, per protocol, with a single status per port across families.
+RunStatuses = Dict[str, Dict[str, PortSet]]
+
+ERROR_STATUSES = ('bind_error', 'in_use')
+
+
+def combine_statuses(statuses: Iterable[str]) -> str:
+    """Reduce the per-family statuses of a port to one: open wins, then closed, then the first error."""
+    statuses = list(statuses)
+    if 'open' in statuses:
+        return 'open'
+    if 'closed' in statuses:
+        return 'closed'
+    return statuses[0]
+
+
+def combine_port_sets(by_status: Dict[str, PortSet]) -> Dict[str, PortSet]:
+    """Apply combine_statuses() to whole port sets, so every port keeps a single status."""
+    combined = {}
+    taken = PortSet()
+    for status in STATUSES[1:]:
+        combined[status] = by_status.get(status, PortSet()) - taken
+        taken = taken | combined[status]
+    return combined
+
+
+def statuses_from_store(results: ResultStore) -> RunStatuses:
+    """Summarize a result store without visiting ports one by one."""
+    run = {}
+    for protocol in PROTOCOLS:
+        by_status = { status: PortSet() for status in STATUSES[1:] }
+        for family in results.families:
+            for status in by_status:
+                by_status[status] = by_status[status] | results.port_set(family, protocol, status)
+        run[protocol] = combine_port_sets(by_status)
+    return run
+
+
+def statuses_from_verdicts(verdicts: Dict[PortKey, List[str]]) -> RunStatuses:
+    """Summarize statuses listed per (protocol, port)."""
+    ports: Dict[str, Dict[str, List[int]]] = { protocol: { status: [] for status in STATUSES[1:] } for protocol in PROTOCOLS }
+    for (protocol, port), statuses in verdicts.items():
+        ports[protocol][combine_statuses(statuses)].append(port)
+    return { protocol: { status: PortSet.from_ports(found) for status, found in by_status.items() } for protocol, by_status in ports.items() }
+
+
+def statuses_from_history(history: ScanHistory) -> RunStatuses:
+    """Summarize the last verdict of every port in a scan history."""
+    return statuses_from_verdicts({ key: [status] for key, status in history.verdicts.items() })
+
+
+def load_run(path: str) -> RunStatuses:
+    """Load a previous run from a CSV, JSON or NDJSON export, optionally gzipped, or from a scan history file."""
+    opener = gzip.open if path.lower().endswith('.gz') else open
+    export_format = guess_export_format(path)
+
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        if export_format == 'csv':
+            records: Iterator[Dict] = csv.DictReader(f)
+        elif export_format == 'json':
+            records = iter(json.load(f))
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+
+        verdicts: Dict[PortKey, List[str]] = {}
+        for record in records:
+            if record.get('status') in STATUSES[1:] and record.get('protocol') in PROTOCOLS:
+                verdicts.setdefault((record['protocol'], int(record['port'])), []).append(record['status'])
+
+    return statuses_from_verdicts(verdicts)
+
+
+class RunDiff:
+    """Ports whose verdict changed between two runs, among the ports both runs checked."""
+
+    def __init__(self, before: RunStatuses, after: RunStatuses) -> None:
+        """Compare two runs with linear-time merges of their sorted intervals."""
+        self.opened: Dict[str, PortSet] = {}
+        self.closed: Dict[str, PortSet] = {}
+        self.errored: Dict[str, PortSet] = {}
+
+        for protocol in PROTOCOLS:
+            previous = before.get(protocol, {})
+            current = after.get(protocol, {})
+            was_open = previous.get('open', PortSet())
+            was_closed = previous.get('closed', PortSet())
+            was_checked = PortSet()
+            for ports in previous.values():
+                was_checked = was_checked | ports
+
+            now_errored = PortSet()
+            for status in ERROR_STATUSES:
+                now_errored = now_errored | current.get(status, PortSet())
+
+            self.opened[protocol] = current.get('open', PortSet()) & (was_checked - was_open)
+            self.closed[protocol] = current.get('closed', PortSet()) & was_open
+            self.errored[protocol] = now_errored & (was_open | was_closed)
+
+
+    def changes(self) -> Dict[str, Dict[str, PortSet]]:
+        """Return the changed ports by kind of change, then protocol."""
+        return { 'opened': self.opened, 'closed': self.closed, 'newly errored': self.errored }
+
+
+    def count(self) -> int:
+        """Count the ports that changed."""
+        return sum(len(ports) for by_protocol in self.changes().values() for ports in by_protocol.values())
+
+
+def log_diff(diff: RunDiff, baseline: str) -> None:
+    """Log how many ports changed since the baseline run, and which ones."""
+    changes = diff.changes()
+    logging.info("Compared with %s: %s.", baseline, ", ".join(
+        f"{sum(len(ports) for ports in by_protocol.values())} {change}" for change, by_protocol in changes.items()
+    ))
+    for change, by_protocol in changes.items():
+        ports = " ".join(f"{protocol}:{ports}" for protocol, ports in by_protocol.items() if ports)
+        if ports:
+            logging.info("%s: %s", change.capitalize(), ports)
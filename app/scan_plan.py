@@ -0,0 +1,108 @@
+import json
+import logging
+from itertools import repeat, zip_longest
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.port_set import PortSet
+
+PortKey = Tuple[str, int]
+
+LATENCY_SMOOTHING = 0.3
+
+
+class ScanHistory:
+    """Remember the last verdict and a smoothed answer latency for every port checked."""
+
+    def __init__(self) -> None:
+        """Initialize an empty history."""
+        self.verdicts: Dict[PortKey, str] = {}
+        self.latencies: Dict[PortKey, float] = {}
+
+
+    def record(self, protocol: str, port: int, status: str, latency: Optional[float] = None) -> None:
+        """Store the verdict of a port and fold its latency into the moving average."""
+        key = (protocol, port)
+        self.verdicts[key] = status
+        if latency is not None:
+            previous = self.latencies.get(key)
+            self.latencies[key] = latency if previous is None else previous + LATENCY_SMOOTHING * (latency - previous)
+
+
+    def load(self, path: str) -> None:
+        """Load a history saved by save(), ignoring a missing or unreadable file."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning("Could not load scan history from %s: %s", path, e)
+            return
+
+        for entry in data:
+            key = (entry['protocol'], entry['port'])
+            self.verdicts[key] = entry['status']
+            if entry.get('latency') is not None:
+                self.latencies[key] = entry['latency']
+
+
+    def save(self, path: str) -> None:
+        """Write the history to a JSON file."""
+        data = [
+            { 'protocol': protocol, 'port': port, 'status': status, 'latency': self.latencies.get((protocol, port)) }
+            for (protocol, port), status in self.verdicts.items()
+        ]
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+        except OSError as e:
+            logging.warning("Could not save scan history to %s: %s", path, e)
+
+
+def plan_scan(ports_list: Dict[str, PortSet], history: Optional[ScanHistory] = None,
+              local_conflicts: Optional[Dict[str, PortSet]] = None) -> Iterator[PortKey]:
+    """Yield (protocol, port) pairs in the order they should be checked.
+
+    Ports open last time come first, then ports with a known history, slowest first so their
+    answers are not the last to arrive. Ports never seen before follow, with TCP and UDP
+    interleaved, and ports known to conflict with a local listener, now or in the last run,
+    are deferred to the end.
+    Only ports with a history are sorted; the rest stream straight from the port sets.
+    """
+    history = history or ScanHistory()
+    local_conflicts = local_conflicts or {}
+    prioritized: List[Tuple[Tuple, PortKey]] = []
+    seen = { protocol: [] for protocol in ports_list }
+    bind_errors = { protocol: [] for protocol in ports_list }
+
+    for (protocol, port), status in history.verdicts.items():
+        if protocol not in ports_list or port not in ports_list[protocol]:
+            continue
+        if status in ('bind_error', 'in_use'):
+            bind_errors[protocol].append(port)
+            continue
+        seen[protocol].append(port)
+        latency = history.latencies.get((protocol, port), 0.0)
+        prioritized.append(((status != 'open', -latency, port), (protocol, port)))
+
+    deferred = {
+        protocol: ports & (local_conflicts.get(protocol, PortSet()) | PortSet.from_ports(bind_errors[protocol]))
+        for protocol, ports in ports_list.items()
+    }
+
+    prioritized.sort()
+    for _, (protocol, port) in prioritized:
+        if port not in deferred[protocol]:
+            yield protocol, port
+
+    remaining = { protocol: ports - PortSet.from_ports(seen[protocol]) - deferred[protocol] for protocol, ports in ports_list.items() }
+    yield from interleave(remaining)
+    yield from interleave(deferred)
+
+
+def interleave(ports_list: Dict[str, PortSet]) -> Iterator[PortKey]:
+    """Alternate lazily between protocols so neither waits for the other to finish."""
+    streams = [zip(repeat(protocol), ports) for protocol, ports in ports_list.items()]
+    for keys in zip_longest(*streams):
+        for key in keys:
+            if key is not None:
+                yield key
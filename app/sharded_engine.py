@@ -0,0 +1,293 @@
+import asyncio
+import itertools
+import socket
+import time
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+from app.port_set import Interval, PortSet
+from app.result_store import PORT_SLOTS, PROTOCOLS, ResultStore
+from app.network_utils import get_host_families, get_local_listeners
+from app.port_utils import create_configured_probe_backend, create_listening_sockets, local_conflict_mode, port_logger, scan_concurrency, PortsList
+from app.probe_backends import ProbeBackend
+from app.scan_plan import interleave
+from app.exporters import ResultExporter
+from app.profiler import record_phase
+from app.progress import ScanProgress
+from config.logging_config import flush_log_summary, forward_child_logs, setup_child_logging
+
+ShardIntervals = Dict[str, List[Interval]]
+
+POLL_INTERVAL = 0.1
+
+
+class CompletionLog:
+    """Ports finished by the shards, in shared memory, with one segment per shard written by that shard alone.
+
+    An entry is a packed (protocol, port) key and the time the port took to check. Shared memory
+    starts zeroed, so keys are stored plus one and a zero key ends what a segment has published.
+    Writers store the duration before the key, so a reader never sees a key without its duration.
+    """
+
+    def __init__(self, buffer: memoryview, sizes: List[int]) -> None:
+        """Map segments holding the given numbers of entries onto buffer."""
+        total = sum(sizes)
+        self._keys = buffer[:4 * total].cast('I')
+        self._durations_us = buffer[4 * total:8 * total].cast('I')
+        self._sizes = sizes
+        self._starts = list(itertools.accumulate([0] + sizes[:-1]))
+        self._cursors = [0] * len(sizes)
+
+
+    @staticmethod
+    def buffer_size(sizes: List[int]) -> int:
+        """Return the size in bytes of a log with segments of the given sizes."""
+        return 8 * sum(sizes)
+
+
+    def append(self, segment: int, protocol: str, port: int, duration: float) -> None:
+        """Publish a finished port and its duration in seconds. Only the shard owning the segment may call this."""
+        index = self._starts[segment] + self._cursors[segment]
+        self._durations_us[index] = min(int(duration * 1_000_000), 0xFFFFFFFF)
+        self._keys[index] = PROTOCOLS.index(protocol) * PORT_SLOTS + port + 1
+        self._cursors[segment] += 1
+
+
+    def read_new(self) -> List[Tuple[str, int, float]]:
+        """Return the ports published since the last call as (protocol, port, duration in seconds)."""
+        finished = []
+        for segment, start in enumerate(self._starts):
+            cursor = self._cursors[segment]
+            while cursor < self._sizes[segment] and self._keys[start + cursor]:
+                protocol_index, port = divmod(self._keys[start + cursor] - 1, PORT_SLOTS)
+                finished.append((PROTOCOLS[protocol_index], port, self._durations_us[start + cursor] / 1_000_000))
+                cursor += 1
+            self._cursors[segment] = cursor
+        return finished
+
+
+    def release(self) -> None:
+        """Drop the views on the shared buffer so it can be closed."""
+        self._keys.release()
+        self._durations_us.release()
+
+
+def run_sharded(ports_list: PortsList, host: str, shards: int, exporter: Optional[ResultExporter] = None,
+                concurrency: int = scan_concurrency, progress: Optional[ScanProgress] = None) -> ResultStore:
+    """Check the ports across a pool of processes, each with its own event loop, and merge their results.
+
+    Every process binds its own contiguous slice of the ports and writes its verdicts straight
+    into one shared-memory result store, so merging costs a single copy at the end. Finished
+    ports are also published in a shared completion log, which the parent polls to stream them
+    to the exporter and to update the progress, if given, while the shards run.
+    """
+    families = get_host_families(host)
+    local_listeners = get_local_listeners(host)
+
+    to_check: PortsList = {}
+    in_use: PortsList = {}
+    skipped: PortsList = {}
+    for protocol, ports in ports_list.items():
+        in_use[protocol] = ports & local_listeners.get(protocol, PortSet())
+        to_check[protocol] = ports
+        skipped[protocol] = PortSet()
+        if local_conflict_mode != 'check':
+            to_check[protocol] = ports - in_use[protocol]
+            skipped[protocol] = in_use[protocol]
+
+    jobs = split_shards(to_check, shards)
+    sizes = [sum(len(ports) for ports in job.values()) for job in jobs]
+    store_size = ResultStore.buffer_size(families)
+    shared_memory = SharedMemory(create=True, size=store_size + CompletionLog.buffer_size(sizes))
+    shared = ResultStore(families, shared_memory.buf)
+    completions = CompletionLog(shared_memory.buf[store_size:], sizes)
+
+    try:
+        finished = 0
+        for protocol, ports in skipped.items():
+            for port in ports:
+                for family in families:
+                    shared.set_status(family, protocol, port, 'in_use')
+                if exporter is not None:
+                    export_port(shared, host, protocol, port, exporter, 0.0)
+                finished += 1
+
+        logging.info("Checking %s ports in %s shards.", sum(sizes), len(jobs))
+
+        start = time.perf_counter()
+        if jobs:
+            # Shards send their log records back here, so they are filtered, summarized and written like ours.
+            context = multiprocessing.get_context('spawn')
+            log_queue = context.Queue()
+            log_forwarder = threading.Thread(target=forward_child_logs, args=(log_queue,), name='shard-logs', daemon=True)
+            log_forwarder.start()
+            try:
+                with ProcessPoolExecutor(max_workers=len(jobs), mp_context=context,
+                                         initializer=setup_child_logging, initargs=(log_queue, logging.getLogger().getEffectiveLevel())) as pool:
+                    futures = [
+                        pool.submit(run_shard, shared_memory.name, families, host,
+                                    { protocol: ports.intervals for protocol, ports in job.items() },
+                                    { protocol: (ports & in_use[protocol]).intervals for protocol, ports in job.items() },
+                                    concurrency, segment, sizes)
+                        for segment, job in enumerate(jobs)
+                    ]
+                    while True:
+                        # Check before draining, so the last pass sees everything the shards published.
+                        done = all(future.done() for future in futures)
+                        for protocol, port, duration in completions.read_new():
+                            if exporter is not None:
+                                export_port(shared, host, protocol, port, exporter, duration)
+                            finished += 1
+                        if progress is not None:
+                            progress.set_completed(finished)
+                        if done:
+                            break
+                        wait(futures, timeout=POLL_INTERVAL)
+
+                    for index, future in enumerate(futures):
+                        try:
+                            logging.info("Shard %s checked %s ports.", index, future.result())
+                        except Exception as e:
+                            logging.error("Shard %s failed: %s", index, e)
+            finally:
+                log_queue.put(None)
+                log_forwarder.join()
+                log_queue.close()
+                flush_log_summary()
+        record_phase('verdict wait', time.perf_counter() - start)
+
+        results = shared.detach()
+    finally:
+        completions.release()
+        shared.release()
+        shared_memory.close()
+        shared_memory.unlink()
+    return results
+
+
+def split_shards(ports_list: PortsList, shards: int) -> List[PortsList]:
+    """Cut every protocol's ports into at most shards non-empty slices, one per process."""
+    pieces = { protocol: ports.split(shards) for protocol, ports in ports_list.items() }
+    jobs = []
+    for index in range(max(shards, 1)):
+        job = { protocol: chunks[index] if index < len(chunks) else PortSet() for protocol, chunks in pieces.items() }
+        if any(job.values()):
+            jobs.append(job)
+    return jobs
+
+
+def export_port(results: ResultStore, host: str, protocol: str, port: int, exporter: ResultExporter, duration: float) -> None:
+    """Write the verdicts of a finished port to the exporter."""
+    verdicts = {}
+    latencies = {}
+    for family in results.families:
+        status = results.status(family, protocol, port)
+        if status != 'pending':
+            verdicts[family] = status
+        latency = results.latency(family, protocol, port)
+        if latency is not None:
+            latencies[family] = latency
+    exporter.write_port(host, protocol, port, verdicts, latencies, duration)
+
+
+def run_shard(shared_memory_name: str, families: List[str], host: str, shard: ShardIntervals,
+              in_use: ShardIntervals, concurrency: int, segment: int, sizes: List[int]) -> int:
+    """Check one shard in a child process and return how many ports it checked.
+
+    Verdicts go to the shared result store, and finished ports to the shard's segment of the completion log.
+    """
+    shared_memory = SharedMemory(name=shared_memory_name)
+    results = ResultStore(families, shared_memory.buf)
+    completions = CompletionLog(shared_memory.buf[ResultStore.buffer_size(families):], sizes)
+    try:
+        ports_list = { protocol: PortSet(intervals) for protocol, intervals in shard.items() }
+        conflicts = { protocol: PortSet(intervals) for protocol, intervals in in_use.items() }
+        return asyncio.run(check_shard(results, completions, segment, host, ports_list, conflicts, concurrency))
+    finally:
+        completions.release()
+        results.release()
+        shared_memory.close()
+
+
+async def check_shard(results: ResultStore, completions: CompletionLog, segment: int, host: str,
+                      ports_list: PortsList, in_use: PortsList, concurrency: int) -> int:
+    """Check the ports of a shard on this process's event loop, with at most concurrency ports in flight."""
+    backend = create_configured_probe_backend(concurrency * len(results.families))
+    slots = asyncio.Semaphore(concurrency)
+    pending = set()
+    checked = 0
+
+    async def check_and_publish(protocol: str, port: int) -> None:
+        start = time.perf_counter()
+        try:
+            await check_port(results, backend, host, protocol, port, port in in_use[protocol])
+        finally:
+            completions.append(segment, protocol, port, time.perf_counter() - start)
+
+    try:
+        for protocol, port in interleave(ports_list):
+            await slots.acquire()
+            task = asyncio.create_task(check_and_publish(protocol, port))
+            task.add_done_callback(lambda _: slots.release())
+            task.add_done_callback(pending.discard)
+            pending.add(task)
+            checked += 1
+
+        await asyncio.gather(*pending)
+    finally:
+        backend.close()
+    return checked
+
+
+async def check_port(results: ResultStore, backend: ProbeBackend, host: str, protocol: str, port: int, in_use: bool) -> None:
+    """Listen on a port, unless another process already does, and store the probe verdict of every family."""
+    sockets: List[socket.socket] = []
+    if not in_use:
+        try:
+            sockets = create_listening_sockets(protocol, host, port)
+        except OSError as e:
+            port_logger.error("Could not bind %s server on %s:%s: %s", protocol.upper(), host, port, e)
+            for family in results.families:
+                results.set_status(family, protocol, port, 'bind_error')
+            return
+
+    listeners = []
+    try:
+        for sock in sockets:
+            sock.setblocking(False)
+            listeners.append(asyncio.create_task(answer_probes(protocol, sock)))
+
+        probes = await asyncio.gather(*(backend.probe(protocol, port, host, family) for family in results.families), return_exceptions=True)
+        for family, result in zip(results.families, probes):
+            if isinstance(result, Exception):
+                port_logger.error("Error probing %s port %s over %s: %s", protocol.upper(), port, family.upper(), result)
+            else:
+                results.set_status(family, protocol, port, result.status, result.latency)
+                if result.status == 'open':
+                    port_logger.info("Port %s (%s) is open", port, protocol.upper(), extra={'outcome': 'open', 'port_key': (protocol, port, family)})
+                else:
+                    port_logger.info("Port %s (%s) is closed", port, protocol.upper(), extra={'outcome': 'closed', 'port_key': (protocol, port, family)})
+    finally:
+        for listener in listeners:
+            listener.cancel()
+        for sock in sockets:
+            sock.close()
+
+
+async def answer_probes(protocol: str, sock: socket.socket) -> None:
+    """Accept TCP connections or reply to UDP messages on a non-blocking socket until cancelled."""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            if protocol == 'tcp':
+                conn, addr = await loop.sock_accept(sock)
+                conn.close()
+            else:
+                _, addr = await loop.sock_recvfrom(sock, 1024)
+                await loop.sock_sendto(sock, b"PONG", addr)
+            port_logger.info("Answered %s probe from %s", protocol.upper(), addr)
+    except OSError as e:
+        port_logger.error("Socket error in %s listener: %s", protocol.upper(), e)
@@ -0,0 +1,122 @@
+import itertools
+import json
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, List, Optional
+
+# Each group shows up as a process in the trace viewer, with one lane per thread working on it.
+TRACE_GROUPS = { 'tcp': 1, 'udp': 2, 'ui': 3 }
+
+
+class TraceRecorder:
+    """Record spans and instants as Chrome trace events, grouped by protocol with one lane per thread."""
+
+    def __init__(self, path: str) -> None:
+        """Initialize the recorder writing its trace to path."""
+        self.path = path
+        self.events: List[Dict] = []
+        self._origin = time.perf_counter()
+        self._async_ids = itertools.count(1)
+
+
+    def _now(self) -> float:
+        """Return the time since the recorder started, in microseconds."""
+        return (time.perf_counter() - self._origin) * 1_000_000
+
+
+    @contextmanager
+    def span(self, name: str, group: str, category: str, args: Dict) -> Iterator[None]:
+        """Record the block as a complete event on the calling thread's lane."""
+        start = self._now()
+        try:
+            yield
+        finally:
+            # list.append is atomic, so threads can record without a lock.
+            self.events.append({
+                'name': name, 'cat': category, 'ph': 'X', 'ts': round(start, 1), 'dur': round(self._now() - start, 1),
+                'pid': TRACE_GROUPS[group], 'tid': threading.get_ident(), 'args': args,
+            })
+
+
+    @contextmanager
+    def async_span(self, name: str, group: str, category: str, args: Dict) -> Iterator[None]:
+        """Record the block as a begin and end event pair with its own id, for coroutines sharing one thread."""
+        event = { 'name': name, 'cat': category, 'id': next(self._async_ids), 'pid': TRACE_GROUPS[group], 'tid': threading.get_ident() }
+        self.events.append({ **event, 'ph': 'b', 'ts': round(self._now(), 1), 'args': args })
+        try:
+            yield
+        finally:
+            self.events.append({ **event, 'ph': 'e', 'ts': round(self._now(), 1) })
+
+
+    def instant(self, name: str, group: str, category: str, args: Dict) -> None:
+        """Record a point in time on the calling thread's lane."""
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'i', 's': 't', 'ts': round(self._now(), 1),
+            'pid': TRACE_GROUPS[group], 'tid': threading.get_ident(), 'args': args,
+        })
+
+
+    def write(self) -> None:
+        """Write the trace-event JSON file, naming every group and lane."""
+        metadata = [
+            { 'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': { 'name': group.upper() } }
+            for group, pid in TRACE_GROUPS.items()
+        ]
+        lanes = { (event['pid'], event['tid']) for event in self.events }
+        metadata += [
+            { 'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': { 'name': f"worker {tid}" } }
+            for pid, tid in lanes
+        ]
+
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump({ 'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms', 'otherData': { 'pid': os.getpid() } }, f)
+            logging.info("Trace with %s events written to %s.", len(self.events), self.path)
+        except OSError as e:
+            logging.error("Could not write the trace to %s: %s", self.path, e)
+
+
+_recorder: Optional[TraceRecorder] = None
+
+
+def start_tracing(path: str) -> None:
+    """Start recording trace events, writing them to path on stop_tracing()."""
+    global _recorder
+    _recorder = TraceRecorder(path)
+
+
+def stop_tracing() -> None:
+    """Write the recorded trace, if tracing was started."""
+    global _recorder
+    if _recorder is not None:
+        _recorder.write()
+        _recorder = None
+
+
+def is_tracing() -> bool:
+    """Tell whether trace events are being recorded, to skip building costly arguments."""
+    return _recorder is not None
+
+
+def trace_span(name: str, group: str, category: str, **args) -> ContextManager[None]:
+    """Record the block as a span when tracing, and do nothing otherwise."""
+    if _recorder is None:
+        return nullcontext()
+    return _recorder.span(name, group, category, args)
+
+
+def trace_async_span(name: str, group: str, category: str, **args) -> ContextManager[None]:
+    """Record the block as an async span when tracing, so overlapping coroutines on one thread each get their own track."""
+    if _recorder is None:
+        return nullcontext()
+    return _recorder.async_span(name, group, category, args)
+
+
+def trace_instant(name: str, group: str, category: str, **args) -> None:
+    """Record an instant when tracing."""
+    if _recorder is not None:
+        _recorder.instant(name, group, category, args)
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import logging
+from typing import Dict
+import requests
+
+TRANSPORTS = ('requests', 'http2')
+
+
+class TransportConnectionError(Exception):
+    """Raised when the API could not be reached at all."""
+
+
+class ApiTransport:
+    """Send verdict requests to the API and return their HTTP status code.
+
+    Blocking transports only implement get(). Others also implement get_async() and set
+    blocking to False, so callers on an event loop can await requests without a thread each.
+    """
+
+    blocking = True
+
+    def get(self, url: str, headers: Dict[str, str]) -> int:
+        """Send a GET request and return the response status code, raising TransportConnectionError if it could not be sent."""
+        raise NotImplementedError
+
+
+    async def get_async(self, url: str, headers: Dict[str, str]) -> int:
+        """Send a GET request from any event loop and return the response status code."""
+        raise NotImplementedError
+
+
+    def close(self) -> None:
+        """Release the connections held by the transport."""
+
+
+class RequestsTransport(ApiTransport):
+    """HTTP/1.1 through a pooled requests session: one keep-alive connection per concurrent check."""
+
+    def __init__(self, pool_size: int) -> None:
+        """Initialize a session able to keep pool_size connections open."""
+        self.session = requests.Session()
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=pool_size))
+
+
+    def get(self, url: str, headers: Dict[str, str]) -> int:
+        """Send the request through the shared session."""
+        try:
+            return self.session.get(url, headers=headers).status_code
+        except requests.ConnectionError as e:
+            raise TransportConnectionError(e) from e
+
+
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.session.close()
+
+
+class Http2Transport(ApiTransport):
+    """HTTP/2 through httpx: concurrent checks are multiplexed as streams over a few connections.
+
+    The client lives on its own asyncio event loop thread, so checks can be awaited from any
+    event loop with get_async() or sent from any thread with get(). Plain http:// URLs use HTTP/2 with prior
+    knowledge, so the API server must accept cleartext HTTP/2 (h2c).
+    """
+
+    blocking = False
+
+    def __init__(self, connections: int = 1) -> None:
+        """Start the event loop thread and open a client limited to the given number of connections."""
+        import httpx
+        import h2  # noqa: F401, httpx only checks for it once the client is created
+
+        self._httpx = httpx
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='http2-transport', daemon=True)
+        self._thread.start()
+        self._client = asyncio.run_coroutine_threadsafe(self._open_client(connections), self._loop).result()
+
+
+    async def _open_client(self, connections: int):
+        """Create the client inside the event loop that will drive it."""
+        limits = self._httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+        return self._httpx.AsyncClient(http1=False, http2=True, timeout=None, limits=limits)
+
+
+    async def _send(self, url: str, headers: Dict[str, str]) -> int:
+        """Send the request as a new stream and return the response status code. Must run on the transport loop."""
+        try:
+            response = await self._client.get(url, headers=headers)
+        except self._httpx.TransportError as e:
+            raise TransportConnectionError(e) from e
+        return response.status_code
+
+
+    async def get_async(self, url: str, headers: Dict[str, str]) -> int:
+        """Send the request on the transport loop and await its status code without blocking the caller's loop."""
+        if asyncio.get_running_loop() is self._loop:
+            return await self._send(url, headers)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._send(url, headers), self._loop))
+
+
+    def get(self, url: str, headers: Dict[str, str]) -> int:
+        """Hand the request to the event loop and wait for its status code."""
+        return asyncio.run_coroutine_threadsafe(self._send(url, headers), self._loop).result()
+
+
+    def close(self) -> None:
+        """Close the client, then stop the event loop thread."""
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def create_transport(name: str, pool_size: int, http2_connections: int = 1) -> ApiTransport:
+    """Create the transport called name, falling back to requests if it is unknown or its dependency is missing."""
+    if name == 'http2':
+        try:
+            transport = Http2Transport(http2_connections)
+            logging.info("Using the HTTP/2 transport over %s connection(s).", http2_connections)
+            return transport
+        except ImportError as e:
+            logging.warning("HTTP/2 transport unavailable (%s), install httpx[http2]. Falling back to requests.", e)
+    elif name != 'requests':
+        logging.warning("Unknown HTTP transport %s, use one of %s. Falling back to requests.", name, ", ".join(TRANSPORTS))
+
+    return RequestsTransport(pool_size)
@@ -1,14 +1,160 @@
+import atexit
+import copy
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Tuple
 
-def setup_logging(config = ''):
+LOG_FILE = './logs/app.log'
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+PLAIN_LOG_ARGS = (str, int, float, bool, type(None))
+
+_summarizer = None
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue records untouched so the listener thread, not the caller, does the formatting."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Return the record as is; message and exception text are formatted by the listener."""
+        return record
+
+
+class ChildProcessQueueHandler(logging.handlers.QueueHandler):
+    """Queue the records of a child process for the parent, keeping message templates so its summaries still group them."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Return a picklable copy of the record, with plain arguments and the traceback rendered as text."""
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        if isinstance(record.args, tuple):
+            record.args = tuple(arg if isinstance(arg, PLAIN_LOG_ARGS) else str(arg) for arg in record.args)
+        elif record.args:
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+
+class PortLogSummarizer(logging.Filter):
+    """Sample per-port detail lines and report aggregate counts at intervals instead.
+
+    Errors and per-port state changes always pass in full. Outcomes are counted from the
+    'outcome' attribute set by handle_port_status, error classes by message template.
+    """
+
+    def __init__(self, sample_rate: int = 100, interval: float = 5.0) -> None:
+        """Keep one detail line in sample_rate and emit a summary at most every interval seconds."""
+        super().__init__()
+        self.sample_rate = max(1, sample_rate)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._seen = 0
+        self._suppressed = 0
+        self._outcomes = Counter()
+        self._errors = Counter()
+        self._last_outcome: Dict[Tuple, str] = {}
+        self._last_summary = time.monotonic()
+        self._summary_logger = logging.getLogger('ports.summary')
+
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Decide whether a per-port record is written, counting it either way."""
+        outcome = getattr(record, 'outcome', None)
+        state_change = False
+
+        with self._lock:
+            if outcome is not None:
+                self._outcomes[outcome] += 1
+                port_key = getattr(record, 'port_key', None)
+                previous = self._last_outcome.get(port_key)
+                self._last_outcome[port_key] = outcome
+                state_change = previous is not None and previous != outcome
+
+            if record.levelno >= logging.ERROR:
+                self._errors[record.msg] += 1
+                keep = True
+            else:
+                self._seen += 1
+                keep = state_change or self._seen % self.sample_rate == 1 or self.sample_rate == 1
+                if not keep:
+                    self._suppressed += 1
+
+            due = time.monotonic() - self._last_summary >= self.interval
+
+        if due:
+            self.flush()
+        return keep
+
+
+    def flush(self) -> None:
+        """Log the counts gathered since the last summary and reset them."""
+        with self._lock:
+            outcomes, errors, suppressed = self._outcomes, self._errors, self._suppressed
+            self._outcomes, self._errors, self._suppressed = Counter(), Counter(), 0
+            self._last_summary = time.monotonic()
+
+        if not outcomes and not errors and not suppressed:
+            return
+
+        outcome_text = ", ".join(f"{name}={count}" for name, count in sorted(outcomes.items())) or "none"
+        self._summary_logger.info("Port outcomes: %s; %s detail lines sampled out", outcome_text, suppressed)
+        for template, count in errors.most_common():
+            self._summary_logger.info("Errors: %s x %r", count, template)
+
+
+def flush_log_summary() -> None:
+    """Emit the pending port log summary, if summarizing mode is enabled."""
+    if _summarizer is not None:
+        _summarizer.flush()
+
+
+def setup_child_logging(log_queue, level: int) -> None:
+    """Send every record of a child process to log_queue, to be written by the parent with forward_child_logs()."""
+    root = logging.getLogger()
+    root.handlers = [ChildProcessQueueHandler(log_queue)]
+    root.setLevel(level)
+
+
+def forward_child_logs(log_queue) -> None:
+    """Pass the records of child processes to the parent's loggers, and so its filters and handlers, until None arrives."""
+    while (record := log_queue.get()) is not None:
+        logging.getLogger(record.name).handle(record)
+
+
+def setup_logging(config = '', max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT,
+                  summarize: bool = False, sample_rate: int = 100, summary_interval: float = 5.0) -> logging.handlers.QueueListener:
+    """Route all records through a queue to a background listener that formats and writes them."""
+    global _summarizer
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     handlers = [logging.StreamHandler(sys.stderr)]
 
     if config == 'DEBUG':
-        handlers.append(logging.FileHandler('./logs/app.log', mode='a'))
+        os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(LOG_FILE, mode='a', maxBytes=max_bytes, backupCount=backup_count))
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
 
     logging.basicConfig(
         level=logging.DEBUG if config == 'DEBUG' else logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=handlers
-    )
\ No newline at end of file
+        handlers=[DeferredQueueHandler(log_queue)]
+    )
+
+    if summarize:
+        _summarizer = PortLogSummarizer(sample_rate, summary_interval)
+        logging.getLogger('ports').addFilter(_summarizer)
+
+    return listener
@@ -1,30 +1,106 @@
 import os
+import sys
+import argparse
 import logging
 from app.port_knocker import MainWindow
-from app.port_utils import trigger_firewall_prompt
+from app.headless import run_headless
+from app.probe_backends import run_reflector
+from app.agents import run_agent, run_coordinator
+from app.port_utils import trigger_firewall_prompt, firewall_prompt_enabled, agent_token
+from app.exporters import EXPORT_FORMATS
+from app.progress import PROGRESS_INTERVAL
+from app.profiler import start_profiling, stop_profiling
+from app.tracer import start_tracing, stop_tracing
+from app.memory_report import start_memory_report, stop_memory_report
 from config.logging_config import setup_logging
 from resources.resources import qInitResources, qCleanupResources
 from PySide6 import QtWidgets
 
 
+def parse_args() -> argparse.Namespace:
+    """Parse the command line options."""
+    parser = argparse.ArgumentParser(description="Check that port forwarding works for TCP and UDP ports.")
+    parser.add_argument('--headless', action='store_true', help="check the ports given by --ports without opening a window")
+    parser.add_argument('--ports', default='', help="port expression to check in headless mode, e.g. 'tcp:22,80-90,!85'")
+    parser.add_argument('--protocol', default='tcp', choices=['tcp', 'udp'], help="protocol for terms without a prefix")
+    parser.add_argument('--host', help="local IP to listen on, defaults to the first local IP")
+    parser.add_argument('--shards', type=int, default=1, metavar='N', help="split a headless scan across N processes")
+    parser.add_argument('--export', metavar='PATH', help="stream results to PATH as they arrive, '-' for stdout")
+    parser.add_argument('--progress', nargs='?', type=float, const=PROGRESS_INTERVAL, metavar='SECONDS',
+                        help=f"log the progress, throughput and ETA of a headless scan every SECONDS ({PROGRESS_INTERVAL:g} by default)")
+    parser.add_argument('--diff', metavar='PATH', help="compare a headless scan with a previous export or history file at PATH")
+    parser.add_argument('--export-format', choices=EXPORT_FORMATS, help="export format, inferred from PATH by default")
+    parser.add_argument('--gzip', action='store_true', default=None, help="compress the export, implied by a .gz PATH")
+    parser.add_argument('--agent', metavar='[HOST:]PORT', help="run headless as an agent, scanning the ports coordinators ask for")
+    parser.add_argument('--coordinate', nargs='+', metavar='AGENT', help="run --ports on every agent, given as 'host[:port]' or 'host[:port]=ports', and merge the results")
+    parser.add_argument('--agent-token', metavar='TOKEN', help="shared secret between agents and coordinators, AGENT_TOKEN by default")
+    parser.add_argument('--reflector', metavar='[HOST:]PORT', help="run a reflector that knocks back on the ports clients ask for, instead of the checker")
+    parser.add_argument('--no-firewall-prompt', action='store_true', help="skip the firewall warm-up at startup")
+    parser.add_argument('--force-firewall-prompt', action='store_true', help="run the firewall warm-up even if it already succeeded")
+    parser.add_argument('--profile', metavar='PATH', help="write a cProfile and per-phase timing report of the run to PATH")
+    parser.add_argument('--trace', metavar='PATH', help="write a Chrome trace of every listener, request, probe and table update to PATH")
+    parser.add_argument('--memory-report', metavar='PATH', help="write tracemalloc snapshots per subsystem and the peak RSS to PATH")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    setup_logging()
+    args = parse_args()
+
+    setup_logging(
+        summarize=os.getenv("LOG_SUMMARY", "0") == "1",
+        sample_rate=int(os.getenv("LOG_SAMPLE_RATE", "100")),
+        summary_interval=float(os.getenv("LOG_SUMMARY_INTERVAL", "5"))
+    )
+
+    if args.reflector:
+        run_reflector(args.reflector)
+        sys.exit(0)
+
+    if args.coordinate:
+        sys.exit(run_coordinator(args.coordinate, args.ports, args.protocol, args.export, args.export_format, args.gzip, args.agent_token or agent_token))
+
+    run_firewall_prompt = firewall_prompt_enabled and not args.no_firewall_prompt
+
+    if args.profile:
+        start_profiling(args.profile)
+    if args.trace:
+        start_tracing(args.trace)
+    if args.memory_report:
+        start_memory_report(args.memory_report)
+
+    if args.agent:
+        if run_firewall_prompt:
+            trigger_firewall_prompt(args.force_firewall_prompt)
+        sys.exit(run_agent(args.agent, args.host, args.agent_token or agent_token))
+
+    if args.headless:
+        if run_firewall_prompt:
+            trigger_firewall_prompt(args.force_firewall_prompt)
+        exit_code = run_headless(args.ports, args.protocol, args.host, args.export, args.export_format, args.gzip, args.shards, args.diff, args.progress)
+        stop_memory_report()
+        stop_tracing()
+        stop_profiling()
+        sys.exit(exit_code)
 
     logging.info("Loading resources.")
     qInitResources()
 
     try:
-        trigger_firewall_prompt()
+        if run_firewall_prompt:
+            trigger_firewall_prompt(args.force_firewall_prompt)
 
         app = QtWidgets.QApplication()
 
-        window = MainWindow()
+        window = MainWindow(args.export, args.export_format, args.gzip)
         window.show()
         window.ui.lineEdit.setFocus()
         
         app.exec()
     except Exception as e:
-        logging.error(f"An error occurred during application startup: {e}")
+        logging.error("An error occurred during application startup: %s", e)
     finally:
+        stop_memory_report()
+        stop_tracing()
+        stop_profiling()
         logging.info("Cleaning up resources.")
-        qCleanupResources()
\ No newline at end of file
+        qCleanupResources()